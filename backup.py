@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Online backups and portable exports of the bot database.
+
+Snapshots use SQLite's online backup API in small page steps, so workers keep
+reading and writing while a backup runs. Exports are gzip-compressed JSON
+lines for moving the index between hosts.
+
+Usage:
+    python backup.py snapshot
+    python backup.py export <path.jsonl.gz>
+    python backup.py import <path.jsonl.gz>
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = "filebot-export"
+# Tables carried by exports; FTS indexes are rebuilt after import
+EXPORT_TABLES = ["files", "batch_groups", "banned_users", "file_replicas", "pending_deletions",
+                 "user_languages", "outbox"]
+# Tables of the archive database, exported with "tier": "archive"
+ARCHIVE_TABLES = ["files", "batch_groups"]
+
+
+class BackupRestarted(Exception):
+    """Raised from the progress callback to stop a stepped copy that keeps restarting"""
+
+
+class BackupManager:
+    """Take rotating online snapshots of the database"""
+
+    def __init__(self, db_path: str, backup_dir: str, keep: int, pages_per_step: int,
+                 step_sleep: float, archive_path: str = None, max_restarts: int = 3):
+        self.db_path = db_path
+        self.archive_path = archive_path
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.max_restarts = max_restarts
+        self.history = deque(maxlen=20)
+
+    def _copy(self, source_path: str, path: str) -> Tuple[int, int]:
+        """Copy one database in page steps and return (pages, steps)
+
+        A write from another connection makes SQLite start the copy over, so
+        after max_restarts the rest is copied in a single step. In WAL mode that
+        step only holds a read snapshot, which writers do not wait for.
+        """
+        partial = path + ".partial"
+        steps = 0
+        total_pages = 0
+        restarts = 0
+        last_remaining = float("inf")
+
+        def progress(status, remaining, total):
+            nonlocal steps, total_pages, restarts, last_remaining
+            steps += 1
+            total_pages = total
+            if remaining > last_remaining:
+                restarts += 1
+                if restarts > self.max_restarts:
+                    raise BackupRestarted
+            last_remaining = remaining
+            if remaining and self.step_sleep:
+                # Let writers in between steps (sqlite only sleeps when a step is busy)
+                time.sleep(self.step_sleep)
+
+        source = sqlite3.connect(source_path, timeout=30)
+        target = sqlite3.connect(partial)
+        try:
+            # Each step holds the read lock only for pages_per_step pages
+            try:
+                source.backup(target, pages=self.pages_per_step, progress=progress, sleep=self.step_sleep)
+            except BackupRestarted:
+                logger.warning(f"Backup of {source_path} restarted {restarts} times, "
+                               f"copying the rest in one step")
+                source.backup(target, pages=-1)
+                steps += 1
+        finally:
+            target.close()
+            source.close()
+        os.replace(partial, path)
+        return total_pages, steps
+
+    def run_backup(self) -> dict:
+        """Copy the database (and its archive) into a new snapshot and return timing stats"""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        name = f"filebot-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        path = os.path.join(self.backup_dir, name + ".db")
+
+        started = time.perf_counter()
+        pages, steps = self._copy(self.db_path, path)
+        size = os.path.getsize(path)
+        if self.archive_path and os.path.exists(self.archive_path):
+            archive_copy = os.path.join(self.backup_dir, name + ".archive")
+            archive_pages, archive_steps = self._copy(self.archive_path, archive_copy)
+            pages += archive_pages
+            steps += archive_steps
+            size += os.path.getsize(archive_copy)
+
+        stats = {
+            "path": path,
+            "seconds": time.perf_counter() - started,
+            "pages": pages,
+            "steps": steps,
+            "bytes": size,
+        }
+        self.history.append(stats)
+        self.rotate()
+        return stats
+
+    def snapshots(self) -> list:
+        """Snapshot paths, oldest first"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = sorted(name for name in os.listdir(self.backup_dir)
+                       if name.startswith("filebot-") and name.endswith(".db"))
+        return [os.path.join(self.backup_dir, name) for name in names]
+
+    def rotate(self):
+        """Delete all but the newest `keep` snapshots"""
+        snapshots = self.snapshots()
+        for path in snapshots[:max(0, len(snapshots) - self.keep)]:
+            os.remove(path)
+            archive_copy = path[:-len(".db")] + ".archive"
+            if os.path.exists(archive_copy):
+                os.remove(archive_copy)
+
+    async def scheduled_backup(self, context):
+        """Job queue callback: run a snapshot off the event loop"""
+        try:
+            stats = await asyncio.to_thread(self.run_backup)
+        except Exception as e:
+            logger.error(f"Backup failed: {e}")
+            return
+        logger.info(
+            f"Backup {stats['path']}: {stats['bytes']} bytes, {stats['pages']} pages "
+            f"in {stats['steps']} steps, {stats['seconds']:.2f}s"
+        )
+
+
+def export_database(db_path: str, out_path: str, archive_path: str = None) -> dict:
+    """Write every exported table to a gzip-compressed JSONL file"""
+    started = time.perf_counter()
+    counts = {}
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    tiers = [("main", table) for table in EXPORT_TABLES]
+    if archive_path and os.path.exists(archive_path):
+        conn.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+        tiers += [("archive", table) for table in ARCHIVE_TABLES]
+    try:
+        schema_version = conn.execute('PRAGMA user_version').fetchone()[0]
+        with gzip.open(out_path, "wt", encoding="utf-8") as out:
+            out.write(json.dumps({"format": EXPORT_FORMAT, "schema_version": schema_version,
+                                  "created": datetime.now().isoformat()}) + "\n")
+            # One read transaction so the export is a consistent snapshot
+            conn.execute('BEGIN')
+            for tier, table in tiers:
+                key = table if tier == "main" else f"{tier}.{table}"
+                counts[key] = 0
+                for row in conn.execute(f'SELECT * FROM {tier}.{table}'):
+                    out.write(json.dumps({"table": table, "tier": tier, "row": dict(row)},
+                                         ensure_ascii=False) + "\n")
+                    counts[key] += 1
+            conn.execute('COMMIT')
+    finally:
+        conn.close()
+    return {"tables": counts, "seconds": time.perf_counter() - started,
+            "bytes": os.path.getsize(out_path)}
+
+
+def import_database(in_path: str, db_path: str, archive_path: str = None) -> dict:
+    """Load an export into db_path, replacing rows with the same keys"""
+    from database import Database
+
+    started = time.perf_counter()
+    database = Database(db_path, archive_path=archive_path)  # Create or migrate the schema first
+    counts = {}
+    # The attached archive also gets its schema created if missing
+    conn = database._archive_connect()
+    try:
+        columns = {
+            (tier, table): {row[1] for row in conn.execute(f'PRAGMA {tier}.table_info({table})')}
+            for tier, tables in (("main", EXPORT_TABLES), ("archive", ARCHIVE_TABLES))
+            for table in tables
+        }
+        with gzip.open(in_path, "rt", encoding="utf-8") as source:
+            header = json.loads(source.readline())
+            if header.get("format") != EXPORT_FORMAT:
+                raise ValueError(f"{in_path} is not a {EXPORT_FORMAT} file")
+            with conn:
+                for line in source:
+                    record = json.loads(line)
+                    tier, table = record.get("tier", "main"), record["table"]
+                    if (tier, table) not in columns:
+                        continue
+                    # Columns unknown to this schema version are dropped
+                    row = {key: value for key, value in record["row"].items()
+                           if key in columns[tier, table]}
+                    names = ", ".join(row)
+                    placeholders = ", ".join("?" for _ in row)
+                    conn.execute(f'INSERT OR REPLACE INTO {tier}.{table} ({names}) VALUES ({placeholders})',
+                                 list(row.values()))
+                    key = table if tier == "main" else f"{tier}.{table}"
+                    counts[key] = counts.get(key, 0) + 1
+                # REPLACE skips delete triggers, so reindex names from scratch
+                for fts in ("files_fts", "batch_groups_fts"):
+                    conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    finally:
+        conn.close()
+    return {"tables": counts, "seconds": time.perf_counter() - started}
+
+
+def main():
+    from config import (
+        DATABASE_PATH, ARCHIVE_DATABASE_PATH, BACKUP_DIR, BACKUP_KEEP,
+        BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP, BACKUP_MAX_RESTARTS
+    )
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("snapshot", "export", "import"):
+        print(__doc__)
+        sys.exit(1)
+    command = sys.argv[1]
+
+    if command == "snapshot":
+        manager = BackupManager(DATABASE_PATH, BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES_PER_STEP,
+                                BACKUP_STEP_SLEEP, ARCHIVE_DATABASE_PATH, BACKUP_MAX_RESTARTS)
+        print(manager.run_backup())
+    elif len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    elif command == "export":
+        print(export_database(DATABASE_PATH, sys.argv[2], ARCHIVE_DATABASE_PATH))
+    else:
+        print(import_database(sys.argv[2], DATABASE_PATH, ARCHIVE_DATABASE_PATH))
+
+
+if __name__ == "__main__":
+    main()
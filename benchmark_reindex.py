@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark the storage channel reindexer against a fake channel history.
+
+The fake channel mixes documents, videos, photos, text messages and gaps
+(deleted messages). The scan is interrupted halfway and resumed from its
+checkpoint, then repeated to show that re-running only refreshes rows.
+
+Usage: python benchmark_reindex.py [messages] [latency_ms]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+from types import SimpleNamespace
+
+from database import Database
+from reindex import FakeChannelHistory, Reindexer, format_stats
+
+CHANNEL_ID = -1001
+TITLES = ["Naruto Shippuden", "One Piece", "Bleach", "Attack on Titan", "Demon Slayer"]
+
+
+def build_history(messages: int) -> dict:
+    random.seed(42)
+    history = {}
+    for message_id in range(1, messages + 1):
+        roll = random.random()
+        if roll < 0.05:
+            continue  # deleted message
+        if roll < 0.10:
+            history[message_id] = SimpleNamespace(document=None, photo=None, video=None, audio=None)
+            continue  # text message
+        name = f"{random.choice(TITLES)}_E{message_id:05d}"
+        if roll < 0.60:
+            history[message_id] = FakeChannelHistory.media_message("document", f"{name}.mkv", "video/x-matroska")
+        elif roll < 0.90:
+            history[message_id] = FakeChannelHistory.media_message("video", f"{name}.mp4", "video/mp4")
+        else:
+            history[message_id] = FakeChannelHistory.media_message("photo", name)
+    return history
+
+
+async def run(messages: int, latency: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "reindex.db"))
+        source = FakeChannelHistory(build_history(messages), latency)
+        reindexer = Reindexer(db, batch_size=500, window=32, max_gap=200)
+
+        first = await reindexer.run(CHANNEL_ID, source, 1, end_id=messages // 2)
+        print(f"First half:  {format_stats(first)}")
+        resumed = await reindexer.run(CHANNEL_ID, source, 1)
+        print(f"Resumed:     {format_stats(resumed)}")
+        again = await reindexer.run(CHANNEL_ID, source, 1, start_id=1)
+        print(f"Full rerun:  {format_stats(again)}")
+        print(f"Files indexed: {db.get_file_stats()['total_files']}, "
+              f"checkpoint: {db.get_reindex_checkpoint(CHANNEL_ID)}")
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+    asyncio.run(run(messages, latency))
+
+
+if __name__ == "__main__":
+    main()
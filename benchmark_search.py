@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark Database.search_files on a large synthetic files table.
+
+Usage: python benchmark_search.py [rows]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from database import Database
+
+TITLES = ["Naruto Shippuden", "One Piece", "Bleach", "Attack on Titan", "Demon Slayer",
+          "Jujutsu Kaisen", "Spy x Family", "Chainsaw Man", "Dragon Ball Super", "Haikyuu"]
+QUALITIES = ["SD", "HD", "FHD", "4K"]
+QUERIES = ["naruto", "one pi", "bleach s03", "demon slayer s01", "jujutsu fhd", "haik", "dragon ball s0"]
+
+
+def populate(db: Database, rows: int):
+    random.seed(42)
+    with db._connect() as conn:
+        conn.executemany(
+            '''
+            INSERT INTO files (file_code, file_id, file_name, file_type, message_id, uploaded_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''',
+            (
+                (f"{index:08x}", f"file_{index}",
+                 f"[@Anime_Hub_Official_1] {random.choice(TITLES)}_S{random.randint(1, 20):02d}"
+                 f"E{random.randint(1, 30):02d}_{random.choice(QUALITIES)}.mkv",
+                 "video/x-matroska", index, 1)
+                for index in range(rows)
+            )
+        )
+        conn.commit()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "search.db"))
+        started = time.perf_counter()
+        populate(db, rows)
+        print(f"Inserted {rows} rows (with FTS triggers) in {time.perf_counter() - started:.1f}s")
+
+        for query in QUERIES:
+            timings = []
+            for _ in range(20):
+                started = time.perf_counter()
+                results = db.search_files(query, 20)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f"{query!r:>18}: {len(results):2d} results, "
+                  f"median {timings[len(timings) // 2] * 1000:6.2f}ms, max {timings[-1] * 1000:6.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
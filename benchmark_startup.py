@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold vs warm boot.
+
+Each boot runs in a fresh interpreter and times the same phases the bot
+reports at startup: imports, database open and cache pre-warm.
+
+- cold: a new database file, so init_db runs the full DDL and migrations
+- warm: an existing database whose schema version is current, so DDL is skipped
+
+Usage: python benchmark_startup.py [runs]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+from startup import StartupTimer
+timer = StartupTimer(started)
+import config, database, plans, state
+try:
+    import handlers
+except ImportError:
+    pass
+timer.mark("imports")
+db = database.Database(sys.argv[1])
+timer.mark("database")
+db.load_banned_users()
+db.get_recent_batch_ids(config.PREWARM_BATCHES)
+timer.mark("prewarm")
+print(json.dumps({"phases": dict(timer.phases), "schema_current": db.schema_current}))
+'''
+
+
+def boot(db_path: str) -> dict:
+    """Run one boot in a subprocess and return its phase timings"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, db_path],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def summarize(label: str, boots: list):
+    phases = boots[0]["phases"].keys()
+    means = {phase: sum(b["phases"][phase] for b in boots) / len(boots) for phase in phases}
+    columns = " ".join(f"{phase} {seconds * 1000:7.2f}ms" for phase, seconds in means.items())
+    print(f"{label:>5}: {columns}  total {sum(means.values()) * 1000:7.2f}ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cold = [boot(os.path.join(tmp, f"cold_{run}.db")) for run in range(runs)]
+        warm_path = os.path.join(tmp, "warm.db")
+        boot(warm_path)
+        warm = [boot(warm_path) for _ in range(runs)]
+
+    assert not any(b["schema_current"] for b in cold)
+    assert all(b["schema_current"] for b in warm)
+    summarize("cold", cold)
+    summarize("warm", warm)
+
+
+if __name__ == "__main__":
+    main()
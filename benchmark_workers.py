@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark update throughput of the sharded worker deployment.
+
+Synthetic updates from many users are routed with ShardRouter to 1..N worker
+processes. Each worker simulates a handler: some CPU work (formatting, hashing)
+plus a write to the shared SQLite state backend, then acknowledges the update.
+
+Usage: python benchmark_workers.py [updates] [max_workers]
+"""
+
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from state import SQLiteStateBackend
+from workers import ShardRouter
+
+HANDLER_CPU_ROUNDS = 2000
+
+
+def simulated_worker(queue, done, state_path):
+    """Consume updates like a bot worker would"""
+    state = SQLiteStateBackend(state_path)
+    while True:
+        data = queue.get()
+        if data is None:
+            break
+        user_id = data["message"]["from"]["id"]
+        digest = str(user_id).encode()
+        for _ in range(HANDLER_CPU_ROUNDS):
+            digest = hashlib.sha256(digest).digest()
+        state.set(f"last_seen:{user_id}", data["update_id"])
+        done.put(1)
+
+
+def run(updates: int, worker_count: int, state_path: str) -> float:
+    """Route updates through worker_count processes and return updates/sec"""
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue() for _ in range(worker_count)]
+    done = context.Queue()
+    router = ShardRouter(queues)
+    processes = [
+        context.Process(target=simulated_worker, args=(queue, done, state_path))
+        for queue in queues
+    ]
+    for process in processes:
+        process.start()
+
+    # Warm up so process start-up is not measured
+    for user_id in range(worker_count):
+        router.route({"update_id": 0, "message": {"from": {"id": user_id}}})
+    for _ in range(worker_count):
+        done.get()
+
+    start = time.perf_counter()
+    for update_id in range(updates):
+        router.route({"update_id": update_id, "message": {"from": {"id": 1000 + update_id % 997}}})
+    for _ in range(updates):
+        done.get()
+    elapsed = time.perf_counter() - start
+
+    router.stop()
+    for process in processes:
+        process.join()
+    return updates / elapsed
+
+
+def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else min(os.cpu_count() or 1, 8)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, "state.db")
+        SQLiteStateBackend(state_path)
+
+        print(f"{'workers':>8} {'updates/s':>12} {'speedup':>8}")
+        baseline = None
+        worker_count = 1
+        while worker_count <= max_workers:
+            rate = run(updates, worker_count, state_path)
+            baseline = baseline or rate
+            print(f"{worker_count:>8} {rate:>12.1f} {rate / baseline:>7.2f}x")
+            worker_count *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Bit array probed by k hashes: no false negatives, tunable false positives"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Double hashing: k probes derived from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def estimated_error_rate(self) -> float:
+        """False positive probability for the current number of keys"""
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+
+class CodeIndex:
+    """Bloom filter of every valid file code and batch id, hot and archived
+
+    Built from the database after startup and updated on every insert made by
+    this process. Codes inserted by other workers are picked up by an
+    incremental sync, run at most once per sync_interval when a code misses.
+    Until the first build finishes every code is let through. Provisional
+    links of uploads still in the outbox count as valid codes.
+    """
+
+    def __init__(self, database, error_rate: float, sync_interval: float):
+        self.db = database
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.bloom = None
+        self._file_rowid = 0
+        self._batch_seq = 0
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        # Codes added while a rebuild reads the database, replayed into the new filter
+        self._rebuild_added = None
+        self._rebuild_task = None
+        # Metrics
+        self.rejected = 0
+        self.passed = 0
+        self.false_positives = 0
+
+    def build(self) -> int:
+        """(Re)build the filter from the database and return the number of codes"""
+        with self._lock:
+            self._rebuild_added = []
+        try:
+            codes, file_rowid, batch_seq = self.db.get_codes_since(0, 0)
+            codes += self.db.get_archived_codes()
+            codes += self.db.get_pending_upload_codes()
+            bloom = BloomFilter(max(2 * len(codes), 10000), self.error_rate)
+            for code in codes:
+                bloom.add(code)
+            with self._lock:
+                for code in self._rebuild_added:
+                    bloom.add(code)
+                self.bloom = bloom
+                self._file_rowid = file_rowid
+                self._batch_seq = batch_seq
+                self._last_sync = time.monotonic()
+        finally:
+            with self._lock:
+                self._rebuild_added = None
+        return len(codes)
+
+    def add(self, code: str):
+        """Register a newly inserted code"""
+        if self.bloom is None:
+            return
+        with self._lock:
+            if self._rebuild_added is not None:
+                self._rebuild_added.append(code)
+            # Provisional upload links are announced when queued and again when saved
+            if code in self.bloom:
+                return
+            self.bloom.add(code)
+        if self.bloom.count > self.bloom.capacity and self._rebuild_added is None:
+            self._rebuild()
+
+    def _rebuild(self):
+        """Rebuild a filter that went over capacity, off the event loop when called on it"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Already on a worker thread (prewarm, reindex)
+            logger.info("Code filter over capacity, rebuilding")
+            self.build()
+            return
+        if self._rebuild_task and not self._rebuild_task.done():
+            return
+        logger.info("Code filter over capacity, rebuilding in the background")
+        # The current filter keeps answering (a bit less precisely) until the swap
+        self._rebuild_task = loop.create_task(asyncio.to_thread(self.build))
+
+    def _sync(self):
+        """Add codes inserted by other workers since the last build or sync"""
+        codes, file_rowid, batch_seq = self.db.get_codes_since(self._file_rowid, self._batch_seq)
+        codes += self.db.get_pending_upload_codes()
+        with self._lock:
+            for code in codes:
+                # Pending uploads come back on every sync until they are stored
+                if code not in self.bloom:
+                    self.bloom.add(code)
+            self._file_rowid = max(self._file_rowid, file_rowid)
+            self._batch_seq = max(self._batch_seq, batch_seq)
+            self._last_sync = time.monotonic()
+
+    def might_exist(self, code: str) -> bool:
+        """False means the code is definitely invalid"""
+        if self.bloom is None:
+            return True
+        if code not in self.bloom:
+            if time.monotonic() - self._last_sync < self.sync_interval:
+                self.rejected += 1
+                return False
+            self._sync()
+            if code not in self.bloom:
+                self.rejected += 1
+                return False
+        self.passed += 1
+        return True
+
+    def record_false_positive(self):
+        """Count a code that passed the filter but was not in the database"""
+        if self.bloom is None:
+            # Not built yet, so the code was let through without a check
+            return
+        self.false_positives += 1
+
+    def stats(self) -> dict:
+        invalid = self.rejected + self.false_positives
+        return {
+            "codes": self.bloom.count if self.bloom else 0,
+            "rejected": self.rejected,
+            "false_positives": self.false_positives,
+            # Share of invalid codes that slipped through to the database
+            "observed_fp_rate": self.false_positives / invalid if invalid else 0.0,
+            "estimated_fp_rate": self.bloom.estimated_error_rate() if self.bloom else 0.0,
+        }
@@ -5,6 +5,70 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "7918521477:AAE5Nm04alKrgNQ6LAl83xKyYmdgqJ_aP
 ADMIN_USER_ID = int(os.getenv("ADMIN_USER_ID", "7019013170"))
 STORAGE_CHANNEL_ID = int(os.getenv("STORAGE_CHANNEL_ID", "-1002921970479"))
 
+# Pool of storage channels uploads are spread across (comma separated ids)
+STORAGE_CHANNEL_IDS = [
+    int(channel_id) for channel_id in os.getenv("STORAGE_CHANNEL_IDS", str(STORAGE_CHANNEL_ID)).split(",")
+    if channel_id.strip()
+]
+# Copies of each file to keep across the pool (primary included)
+STORAGE_REPLICAS = int(os.getenv("STORAGE_REPLICAS", "2"))
+REPLICATION_INTERVAL = int(os.getenv("REPLICATION_INTERVAL", "600"))  # seconds
+REPLICATION_BATCH_SIZE = 50
+# Files whose copies fail are retried after REPLICATION_INTERVAL * 2^failures, capped here
+REPLICATION_MAX_DELAY = int(os.getenv("REPLICATION_MAX_DELAY", "86400"))  # seconds
+
+# Number of compiled batch delivery plans kept in memory
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+# Seconds a plan is trusted; bounds staleness when another worker changes a batch
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", "300"))
+
+# Warm start: recent batches compiled in the background after boot
+PREWARM_BATCHES = int(os.getenv("PREWARM_BATCHES", "50"))
+# Seconds before the in-memory ban list is reloaded from the database
+BAN_CACHE_TTL = int(os.getenv("BAN_CACHE_TTL", "30"))
+
+# Bloom filter rejecting invalid share codes before any database lookup
+CODE_FILTER_ERROR_RATE = float(os.getenv("CODE_FILTER_ERROR_RATE", "0.001"))
+# Minimum seconds between syncs of codes inserted by other workers
+CODE_FILTER_SYNC_INTERVAL = float(os.getenv("CODE_FILTER_SYNC_INTERVAL", "1.0"))
+
+# Maximum results returned by the inline search (@bot <query>)
+INLINE_SEARCH_LIMIT = 20
+
+# Online backups: rotating snapshots taken in small page steps
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "3600"))  # seconds, 0 disables
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "24"))
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.01  # seconds between steps
+# Writes from other connections restart a stepped copy; after this many the
+# rest is copied in one step (a WAL read snapshot, writers are not blocked)
+BACKUP_MAX_RESTARTS = 3
+
+# /reindex: rebuild the files index from a storage channel's messages.
+# Bots cannot read channel history, so each message id is forwarded to
+# REINDEX_PROBE_CHAT_ID and deleted again. It must be set explicitly to a
+# private scratch channel (0 disables reindexing)
+REINDEX_PROBE_CHAT_ID = int(os.getenv("REINDEX_PROBE_CHAT_ID", "0"))
+REINDEX_BATCH_SIZE = 500  # rows upserted per transaction
+REINDEX_CONCURRENCY = 8  # message ids probed in parallel
+REINDEX_MAX_GAP = 200  # consecutive missing ids that end the scan
+
+# /profile window length in seconds
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 120
+
+# Outbox: storage copies and deliveries retried in the background with
+# exponential backoff (BASE_DELAY * 2^attempts, capped at MAX_DELAY, jittered)
+OUTBOX_POLL_INTERVAL = 5  # seconds
+OUTBOX_BATCH_SIZE = 100  # operations loaded per pass
+OUTBOX_BASE_DELAY = 2.0
+OUTBOX_MAX_DELAY = 600.0
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+
+# Seconds to wait for in-flight deliveries when shutting down
+SHUTDOWN_DRAIN_TIMEOUT = int(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "20"))
+
 # Required channels for membership verification  
 REQUIRED_CHANNELS = [
     {"name": "Channel 1", "url": "https://t.me/+TqNWX2cXQ6w4ZDFl"},
@@ -15,23 +79,86 @@ REQUIRED_CHANNELS = [
 
 # Database configuration
 DATABASE_PATH = "filebot.db"
+# Cold files and batches are moved here; a hot-tier miss falls back to it
+ARCHIVE_DATABASE_PATH = os.getenv("ARCHIVE_DATABASE_PATH", "filebot_archive.db")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "86400"))  # seconds, 0 disables
+# Files moved per transaction and the pause between them, so the archive job
+# never holds the write lock for long
+ARCHIVE_CHUNK_SIZE = 2000
+ARCHIVE_CHUNK_SLEEP = 0.01  # seconds
+ACCESS_FLUSH_INTERVAL = 60  # seconds between last-access writes
+
+# Worker deployment configuration
+# With WORKER_COUNT > 1 updates arrive by webhook and are sharded by user id
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "1"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+
+# Shared state backend: "memory" (single worker), "sqlite" (single host) or "redis" (multi-node)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", DATABASE_PATH)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
-# Messages in Bengali and English
+# Messages in Bengali and English, one template set per language. Users pick
+# one with /language; otherwise their Telegram client language is used,
+# falling back to DEFAULT_LANGUAGE
 MESSAGES = {
-    "not_admin": "🚫 দুঃখিত! আপনি এই বট ব্যবহার করার অনুমতি নেই।\n\nSorry! You are not authorized to use this bot.",
-    "banned_user": "⛔ আপনি এই বট ব্যবহার করতে নিষিদ্ধ।\n\n⛔ You are banned from using this bot.",
-    "file_uploaded": "✅ ফাইল সফলভাবে আপলোড হয়েছে!\n\n🔗 শেয়ার লিংক: {link}\n\n✅ File uploaded successfully!\n\n🔗 Share Link: {link}",
-    "batch_uploaded": "✅ {count}টি ফাইল সফলভাবে আপলোড হয়েছে!\n\n🔗 শেয়ার লিংক: {link}\n\n✅ {count} files uploaded successfully!\n\n🔗 Share Link: {link}",
-    "channel_join_required": "⚠️ ফাইল পেতে নিচের চ্যানেলগুলোতে জয়েন করুন:\n\n⚠️ Please join these channels to get the file:",
-    "file_not_found": "❌ ফাইল পাওয়া যায়নি বা লিংক ভুল।\n\n❌ File not found or invalid link.",
-    "welcome": "🤖 স্বাগতম ফাইল শেয়ার বটে!\n\nAdmin রা ফাইল পাঠালে আমি শেয়ার লিংক তৈরি করি।\n\n🤖 Welcome to File Share Bot!\n\nAdmins can send files and I'll create share links.",
-    "processing": "⏳ ফাইল প্রসেসিং হচ্ছে...\n\n⏳ Processing file...",
-    "batch_mode_start": "📦 ব্যাচ মোড চালু হয়েছে! এখন একটার পর একটা ফাইল পাঠান। শেষ হলে /batch_end দিন।\n\n📦 Batch mode started! Send files one by one. Send /batch_end when done.",
-    "batch_mode_end": "📦 ব্যাচ মোড বন্ধ হয়েছে।\n\n📦 Batch mode ended.",
-    "file_delivered": "📁 ফাইল পাঠানো হয়েছে!\n\n⚠️ এই ফাইল 5 মিনিট পর মুছে যাবে। দরকার হলে অন্য কোথাও ফরওয়ার্ড করে রাখুন।\n\n📁 File delivered!\n\n⚠️ This file will be deleted in 5 minutes. Forward it somewhere if needed.",
-    "batch_delivered": "📦 সব ফাইল পাঠানো হয়েছে!\n\n⚠️ এই ফাইলগুলো 5 মিনিট পর মুছে যাবে। দরকার হলে অন্য কোথাও ফরওয়ার্ড করে রাখুন।\n\n📦 All files delivered!\n\n⚠️ These files will be deleted in 5 minutes. Forward them somewhere if needed.",
-    "user_banned": "✅ User {user_id} কে ban করা হয়েছে।\n\n✅ User {user_id} has been banned.",
-    "user_unbanned": "✅ User {user_id} এর ban উঠানো হয়েছে।\n\n✅ User {user_id} has been unbanned.",
-    "user_not_found": "❌ User ID টি সঠিক নয়।\n\n❌ Invalid User ID.",
-    "error": "❌ কোন সমস্যা হয়েছে। আবার চেষ্টা করুন।\n\n❌ Something went wrong. Please try again."
+    "bn": {
+        "not_admin": "🚫 দুঃখিত! আপনি এই বট ব্যবহার করার অনুমতি নেই।",
+        "banned_user": "⛔ আপনি এই বট ব্যবহার করতে নিষিদ্ধ।",
+        "file_uploaded": "✅ ফাইল সফলভাবে আপলোড হয়েছে!\n\n🔗 শেয়ার লিংক: {link}",
+        "batch_uploaded": "✅ {count}টি ফাইল সফলভাবে আপলোড হয়েছে!\n\n🔗 শেয়ার লিংক: {link}",
+        "channel_join_required": "⚠️ ফাইল পেতে নিচের চ্যানেলগুলোতে জয়েন করুন:",
+        "file_not_found": "❌ ফাইল পাওয়া যায়নি বা লিংক ভুল।",
+        "welcome": "🤖 স্বাগতম ফাইল শেয়ার বটে!\n\nAdmin রা ফাইল পাঠালে আমি শেয়ার লিংক তৈরি করি।",
+        "file_queued": "✅ ফাইল পাওয়া গেছে!\n\n🔗 শেয়ার লিংক: {link}\n\n⏳ কয়েক সেকেন্ডের মধ্যে লিংকটি চালু হবে।",
+        "file_processing": "⏳ ফাইলটি এখনও সংরক্ষণ হচ্ছে। একটু পরে আবার লিংকে ক্লিক করুন।",
+        "upload_failed": "❌ ফাইলটি সংরক্ষণ করা যায়নি, {link} লিংকটি কাজ করবে না। ফাইলটি আবার পাঠান।",
+        "delivery_queued": "⏳ এখন ফাইল পাঠানো যাচ্ছে না। একটু পরে স্বয়ংক্রিয়ভাবে পাঠানো হবে।",
+        "batch_mode_start": "📦 ব্যাচ মোড চালু হয়েছে! এখন একটার পর একটা ফাইল পাঠান। শেষ হলে /batch_end দিন।",
+        "batch_mode_end": "📦 ব্যাচ মোড বন্ধ হয়েছে।",
+        "file_delivered": "📁 ফাইল পাঠানো হয়েছে!\n\n⚠️ এই ফাইল 5 মিনিট পর মুছে যাবে। দরকার হলে অন্য কোথাও ফরওয়ার্ড করে রাখুন।",
+        "batch_delivered": "📦 সব ফাইল পাঠানো হয়েছে!\n\n⚠️ এই ফাইলগুলো 5 মিনিট পর মুছে যাবে। দরকার হলে অন্য কোথাও ফরওয়ার্ড করে রাখুন।",
+        "delivery_continuing": "📦 কিছু ফাইল পাঠানো হয়েছে, বাকিগুলো একটু পরে পাঠানো হবে।\n\n⚠️ এই ফাইলগুলো 5 মিনিট পর মুছে যাবে। দরকার হলে অন্য কোথাও ফরওয়ার্ড করে রাখুন।",
+        "user_banned": "✅ User {user_id} কে ban করা হয়েছে।",
+        "user_unbanned": "✅ User {user_id} এর ban উঠানো হয়েছে।",
+        "user_not_found": "❌ User ID টি সঠিক নয়।",
+        "error": "❌ কোন সমস্যা হয়েছে। আবার চেষ্টা করুন।",
+        "join_button": "{name} এ জয়েন করুন",
+        "retry_button": "🔄 পুনরায় চেষ্টা করুন",
+        "language_prompt": "🌐 ভাষা বেছে নিন:",
+        "language_set": "✅ এখন থেকে বাংলায় উত্তর দেওয়া হবে।"
+    },
+    "en": {
+        "not_admin": "Sorry! You are not authorized to use this bot.",
+        "banned_user": "⛔ You are banned from using this bot.",
+        "file_uploaded": "✅ File uploaded successfully!\n\n🔗 Share Link: {link}",
+        "batch_uploaded": "✅ {count} files uploaded successfully!\n\n🔗 Share Link: {link}",
+        "channel_join_required": "⚠️ Please join these channels to get the file:",
+        "file_not_found": "❌ File not found or invalid link.",
+        "welcome": "🤖 Welcome to File Share Bot!\n\nAdmins can send files and I'll create share links.",
+        "file_queued": "✅ File received!\n\n🔗 Share Link: {link}\n\n⏳ The link will work in a few seconds.",
+        "file_processing": "⏳ This file is still being stored. Open the link again in a moment.",
+        "upload_failed": "❌ The file could not be stored, so {link} will not work. Please send it again.",
+        "delivery_queued": "⏳ The file could not be sent right now. It will be sent automatically shortly.",
+        "batch_mode_start": "📦 Batch mode started! Send files one by one. Send /batch_end when done.",
+        "batch_mode_end": "📦 Batch mode ended.",
+        "file_delivered": "📁 File delivered!\n\n⚠️ This file will be deleted in 5 minutes. Forward it somewhere if needed.",
+        "batch_delivered": "📦 All files delivered!\n\n⚠️ These files will be deleted in 5 minutes. Forward them somewhere if needed.",
+        "delivery_continuing": "📦 Some files were delivered, the rest will follow shortly.\n\n⚠️ These files will be deleted in 5 minutes. Forward them somewhere if needed.",
+        "user_banned": "✅ User {user_id} has been banned.",
+        "user_unbanned": "✅ User {user_id} has been unbanned.",
+        "user_not_found": "❌ Invalid User ID.",
+        "error": "❌ Something went wrong. Please try again.",
+        "join_button": "Join {name}",
+        "retry_button": "🔄 Retry",
+        "language_prompt": "🌐 Choose your language:",
+        "language_set": "✅ Replies will now be in English."
+    }
 }
+LANGUAGE_NAMES = {"bn": "বাংলা", "en": "English"}
+DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "en")
+# Join keyboards memoized per (language, missing channels, file code)
+KEYBOARD_CACHE_SIZE = 1024
@@ -1,18 +1,68 @@
+import json
+import os
+import re
 import sqlite3
+import time
 import uuid
 from datetime import datetime
 from typing import Optional, Tuple
 
+# Bump whenever init_db gains new DDL so existing databases get migrated
+SCHEMA_VERSION = 9
+
+# Columns added after the first release, created by ALTER TABLE on older databases
+ADDED_COLUMNS = [
+    ('files', 'storage_channel_id', 'INTEGER DEFAULT NULL'),
+    ('files', 'last_access', 'TIMESTAMP DEFAULT NULL'),
+    ('batch_groups', 'last_access', 'TIMESTAMP DEFAULT NULL'),
+]
+
+# Columns moved between the hot tables and the archive database
+FILE_COLUMNS = ('id, file_code, file_id, file_name, file_type, message_id, uploaded_by, '
+                'upload_date, batch_id, storage_channel_id, last_access')
+BATCH_COLUMNS = 'batch_id, batch_name, created_by, creation_date, last_access'
+
+# Newest matches ranked per search
+SEARCH_CANDIDATES = 500
+
 class Database:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, ban_cache_ttl: int = 30, archive_path: str = None):
         self.db_path = db_path
+        # Cold files and batches are moved to a separate database file so the
+        # hot tables stay small enough to live in the page cache
+        root, ext = os.path.splitext(db_path)
+        self.archive_path = archive_path or f"{root}_archive{ext or '.db'}"
+        self._archive_ready = False
+        # Codes delivered since the last flush_access(), written in bulk
+        self._accessed_files = set()
+        self._accessed_batches = set()
+        # Banned user ids cached in memory; refreshed after ban_cache_ttl seconds
+        # so bans issued by another worker take effect
+        self.ban_cache_ttl = ban_cache_ttl
+        self._banned = None
+        self._banned_loaded_at = 0.0
+        self.schema_current = False
+        # Callbacks notified with every new file code or batch id
+        self.code_listeners = []
         self.init_db()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection that waits on locks held by other workers"""
+        return sqlite3.connect(self.db_path, timeout=30)
+    
     def init_db(self):
-        """Initialize database tables"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Initialize database tables, skipped when the schema version is current"""
+        with self._connect() as conn:
             cursor = conn.cursor()
             
+            cursor.execute('PRAGMA user_version')
+            if cursor.fetchone()[0] == SCHEMA_VERSION:
+                self.schema_current = True
+                return
+            
+            # WAL lets worker processes read while another one writes
+            cursor.execute('PRAGMA journal_mode=WAL')
+            
             # Create files table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS files (
@@ -24,10 +74,34 @@ class Database:
                     message_id INTEGER NOT NULL,
                     uploaded_by INTEGER NOT NULL,
                     upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    batch_id TEXT DEFAULT NULL
+                    batch_id TEXT DEFAULT NULL,
+                    storage_channel_id INTEGER DEFAULT NULL,
+                    last_access TIMESTAMP DEFAULT NULL
+                )
+            ''')
+            
+            # Create file replicas table (extra copies in other storage channels)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS file_replicas (
+                    file_code TEXT NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    PRIMARY KEY (file_code, channel_id)
+                )
+            ''')
+            
+            # Create replication failures table (files whose copies keep failing back off)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS replication_failures (
+                    file_code TEXT PRIMARY KEY,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    last_error TEXT
                 )
             ''')
             
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_files_batch_id ON files (batch_id)')
+            
             # Create banned users table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS banned_users (
@@ -43,37 +117,206 @@ class Database:
                     batch_id TEXT PRIMARY KEY,
                     batch_name TEXT,
                     created_by INTEGER NOT NULL,
-                    creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_access TIMESTAMP DEFAULT NULL
+                )
+            ''')
+            
+            # Bring tables created by older versions up to date.
+            # NULL storage_channel_id means the legacy STORAGE_CHANNEL_ID,
+            # NULL last_access means never accessed since upload
+            for table, column, definition in ADDED_COLUMNS:
+                columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+                if column not in columns:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            
+            # Create pending deletions table (delivered copies awaiting auto-delete)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pending_deletions (
+                    chat_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    delete_at REAL NOT NULL,
+                    worker INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (chat_id, message_id)
                 )
             ''')
             
+            # A storage channel message is indexed at most once; the reindex
+            # upsert is keyed on it and skips messages that are replicas
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_files_storage_message
+                ON files (storage_channel_id, message_id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_file_replicas_message
+                ON file_replicas (channel_id, message_id)
+            ''')
+            
+            # Create reindex checkpoints table (last message id scanned per channel)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reindex_checkpoints (
+                    channel_id INTEGER PRIMARY KEY,
+                    last_message_id INTEGER NOT NULL,
+                    indexed INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Create user languages table (reply language chosen with /language)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_languages (
+                    user_id INTEGER PRIMARY KEY,
+                    language TEXT NOT NULL
+                )
+            ''')
+            
+            # Create outbox table (Bot API operations awaiting a retry)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    file_code TEXT,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    last_error TEXT,
+                    worker INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (worker, next_attempt)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_file_code ON outbox (file_code)')
+            
+            # Full-text indexes over file and batch names, kept in sync by triggers
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                    file_name, content='files', content_rowid='id', prefix='2 3'
+                )
+            ''')
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS batch_groups_fts USING fts5(
+                    batch_name, content='batch_groups', content_rowid='rowid', prefix='2 3'
+                )
+            ''')
+            for table, column, fts in (('files', 'file_name', 'files_fts'),
+                                       ('batch_groups', 'batch_name', 'batch_groups_fts')):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                        INSERT INTO {fts} (rowid, {column}) VALUES (new.rowid, new.{column});
+                    END
+                ''')
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                        INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});
+                    END
+                ''')
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {column} ON {table} BEGIN
+                        INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});
+                        INSERT INTO {fts} (rowid, {column}) VALUES (new.rowid, new.{column});
+                    END
+                ''')
+                # Index rows that existed before the FTS table
+                cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+            
+            # Every batch id ever created, in creation order. Unlike batch_groups'
+            # rowids (reused once the newest batch is archived) seq only grows, so
+            # code filters of other workers can sync new batches by it
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS batch_sequence (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    batch_id TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS batch_groups_sequence AFTER INSERT ON batch_groups BEGIN
+                    INSERT INTO batch_sequence (batch_id) VALUES (new.batch_id);
+                END
+            ''')
+            cursor.execute('''
+                INSERT INTO batch_sequence (batch_id)
+                SELECT batch_id FROM batch_groups
+                WHERE NOT EXISTS (SELECT 1 FROM batch_sequence)
+                ORDER BY rowid
+            ''')
+            
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
             conn.commit()
     
+    def _archive_connect(self) -> sqlite3.Connection:
+        """Open a connection with the archive database attached as `archive`"""
+        conn = self._connect()
+        conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+        if not self._archive_ready:
+            conn.execute('PRAGMA archive.journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS archive.files (
+                    id INTEGER PRIMARY KEY,
+                    file_code TEXT UNIQUE NOT NULL,
+                    file_id TEXT NOT NULL,
+                    file_name TEXT,
+                    file_type TEXT,
+                    message_id INTEGER NOT NULL,
+                    uploaded_by INTEGER NOT NULL,
+                    upload_date TIMESTAMP,
+                    batch_id TEXT DEFAULT NULL,
+                    storage_channel_id INTEGER DEFAULT NULL,
+                    last_access TIMESTAMP DEFAULT NULL,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS archive.idx_files_batch_id ON files (batch_id)')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS archive.idx_files_storage_message
+                ON files (storage_channel_id, message_id)
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS archive.batch_groups (
+                    batch_id TEXT PRIMARY KEY,
+                    batch_name TEXT,
+                    created_by INTEGER NOT NULL,
+                    creation_date TIMESTAMP,
+                    last_access TIMESTAMP DEFAULT NULL,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
+            self._archive_ready = True
+        return conn
+    
+    def _notify_code(self, code: str):
+        for listener in self.code_listeners:
+            listener(code)
+    
     def save_file(self, file_id: str, file_name: str, file_type: str, 
-                  message_id: int, uploaded_by: int, batch_id: str = None) -> str:
+                  message_id: int, uploaded_by: int, batch_id: str = None,
+                  storage_channel_id: int = None, file_code: str = None) -> str:
         """Save file information and return unique code"""
-        file_code = str(uuid.uuid4())[:8]  # Short unique code
+        file_code = file_code or str(uuid.uuid4())[:8]  # Short unique code
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
                 INSERT INTO files (file_code, file_id, file_name, file_type, 
-                                 message_id, uploaded_by, batch_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (file_code, file_id, file_name, file_type, message_id, uploaded_by, batch_id))
+                                 message_id, uploaded_by, batch_id, storage_channel_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (file_code, file_id, file_name, file_type, message_id, uploaded_by, batch_id,
+                  storage_channel_id))
             
             conn.commit()
         
+        self._notify_code(file_code)
         return file_code
     
     def get_file(self, file_code: str) -> Optional[Tuple]:
         """Get file information by code"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT file_id, file_name, file_type, message_id, uploaded_by
+                SELECT file_id, file_name, file_type, message_id, uploaded_by, storage_channel_id
                 FROM files WHERE file_code = ?
             ''', (file_code,))
             
@@ -84,53 +327,627 @@ class Database:
         """Create a new batch group and return batch_id"""
         batch_id = str(uuid.uuid4())[:8]
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO batch_groups (batch_id, batch_name, created_by)
+                VALUES (?, ?, ?)
+            ''', (batch_id, batch_name, created_by))
+            conn.commit()
+        
+        self._notify_code(batch_id)
+        return batch_id
+    
+    def save_batch(self, batch_name: str, created_by: int, files: list) -> str:
+        """Create a batch group together with its files in one transaction and return batch_id
+        
+        `files` are dicts with file_id, file_name, file_type, message_id and
+        optionally storage_channel_id. Nothing is saved if any insert fails.
+        """
+        batch_id = str(uuid.uuid4())[:8]
+        file_codes = [str(uuid.uuid4())[:8] for _ in files]
+        
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO batch_groups (batch_id, batch_name, created_by)
                 VALUES (?, ?, ?)
             ''', (batch_id, batch_name, created_by))
+            cursor.executemany('''
+                INSERT INTO files (file_code, file_id, file_name, file_type,
+                                 message_id, uploaded_by, batch_id, storage_channel_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(file_code, file_info['file_id'], file_info['file_name'], file_info['file_type'],
+                   file_info['message_id'], created_by, batch_id, file_info.get('storage_channel_id'))
+                  for file_code, file_info in zip(file_codes, files)])
             conn.commit()
         
+        self._notify_code(batch_id)
+        for file_code in file_codes:
+            self._notify_code(file_code)
         return batch_id
     
     def get_batch_files(self, batch_id: str) -> list:
         """Get all files in a batch"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT file_id, file_name, file_type, message_id, uploaded_by
+                SELECT file_id, file_name, file_type, message_id, uploaded_by,
+                       storage_channel_id, file_code
                 FROM files WHERE batch_id = ?
             ''', (batch_id,))
             return cursor.fetchall()
     
+    def add_file_replica(self, file_code: str, channel_id: int, message_id: int):
+        """Record a copy of a file in another storage channel"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO file_replicas (file_code, channel_id, message_id)
+                VALUES (?, ?, ?)
+            ''', (file_code, channel_id, message_id))
+            conn.commit()
+    
+    def get_file_replicas(self, file_code: str) -> list:
+        """Get (channel_id, message_id) of every replica of a file"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT channel_id, message_id FROM file_replicas WHERE file_code = ?
+            ''', (file_code,))
+            return cursor.fetchall()
+    
+    def get_under_replicated_files(self, copies: int, limit: int) -> list:
+        """Get files stored in fewer than `copies` channels, skipping those backing off
+        
+        Returns (file_code, storage_channel_id, message_id, replica_channel_ids, failed_attempts) tuples
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT f.file_code, f.storage_channel_id, f.message_id,
+                       GROUP_CONCAT(r.channel_id), COALESCE(rf.attempts, 0)
+                FROM files f
+                LEFT JOIN file_replicas r ON r.file_code = f.file_code
+                LEFT JOIN replication_failures rf ON rf.file_code = f.file_code
+                WHERE rf.next_attempt IS NULL OR rf.next_attempt <= ?
+                GROUP BY f.file_code
+                HAVING COUNT(r.channel_id) + 1 < ?
+                ORDER BY f.id
+                LIMIT ?
+            ''', (time.time(), copies, limit))
+            return [
+                (file_code, channel_id, message_id,
+                 [int(replica) for replica in replicas.split(',')] if replicas else [], attempts)
+                for file_code, channel_id, message_id, replicas, attempts in cursor.fetchall()
+            ]
+    
+    def record_replication_failure(self, file_code: str, next_attempt: float, error: str):
+        """Count a failed replication pass and skip the file until next_attempt"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO replication_failures (file_code, attempts, next_attempt, last_error)
+                VALUES (?, 1, ?, ?)
+                ON CONFLICT (file_code) DO UPDATE SET
+                    attempts = attempts + 1,
+                    next_attempt = excluded.next_attempt,
+                    last_error = excluded.last_error
+            ''', (file_code, next_attempt, error))
+            conn.commit()
+    
+    def clear_replication_failure(self, file_code: str):
+        """Forget the failures of a file that replicated"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM replication_failures WHERE file_code = ?', (file_code,))
+            conn.commit()
+    
+    def add_pending_deletions(self, chat_id: int, message_ids: list, delete_at: float, worker: int = 0):
+        """Persist messages that must be deleted at delete_at (unix time)"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO pending_deletions (chat_id, message_id, delete_at, worker)
+                VALUES (?, ?, ?, ?)
+            ''', [(chat_id, message_id, delete_at, worker) for message_id in message_ids])
+            conn.commit()
+    
+    def remove_pending_deletions(self, chat_id: int, message_ids: list):
+        """Forget messages once they have been deleted"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                'DELETE FROM pending_deletions WHERE chat_id = ? AND message_id = ?',
+                [(chat_id, message_id) for message_id in message_ids]
+            )
+            conn.commit()
+    
+    def get_pending_deletions(self, worker: int = 0) -> list:
+        """Get (chat_id, message_id, delete_at) of deletions owned by a worker"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT chat_id, message_id, delete_at FROM pending_deletions
+                WHERE worker = ? ORDER BY delete_at
+            ''', (worker,))
+            return cursor.fetchall()
+    
+    def reassign_worker_rows(self, worker_count: int) -> int:
+        """Hand outbox operations and pending deletions of workers that no longer
+        exist (index >= worker_count) to worker index % worker_count
+        
+        Returns the number of rows moved
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            moved = 0
+            for table in ('outbox', 'pending_deletions'):
+                cursor.execute(f'UPDATE {table} SET worker = worker % ? WHERE worker >= ?',
+                               (worker_count, worker_count))
+                moved += cursor.rowcount
+            conn.commit()
+            return moved
+    
+    def add_outbox(self, kind: str, chat_id: int, payload: dict, next_attempt: float,
+                   file_code: str = None, worker: int = 0) -> int:
+        """Queue a Bot API operation for the outbox worker and return its id
+        
+        A file_code is a share link that works once the operation ran, so it is
+        announced to the code listeners right away.
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO outbox (kind, chat_id, file_code, payload, next_attempt, worker)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (kind, chat_id, file_code, json.dumps(payload, ensure_ascii=False), next_attempt, worker))
+            conn.commit()
+            op_id = cursor.lastrowid
+        
+        if file_code:
+            self._notify_code(file_code)
+        return op_id
+    
+    def update_outbox_payload(self, op_id: int, values: dict):
+        """Merge values into a queued operation's payload"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE outbox SET payload = json_patch(payload, ?) WHERE id = ?',
+                           (json.dumps(values, ensure_ascii=False), op_id))
+            conn.commit()
+    
+    def get_due_outbox(self, limit: int, worker: int = 0) -> list:
+        """Get operations due now as (id, kind, chat_id, payload, attempts), grouped by chat"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, kind, chat_id, payload, attempts FROM (
+                    SELECT * FROM outbox WHERE worker = ? AND next_attempt <= ?
+                    ORDER BY next_attempt LIMIT ?
+                ) ORDER BY chat_id, id
+            ''', (worker, time.time(), limit))
+            return [(op_id, kind, chat_id, json.loads(payload), attempts)
+                    for op_id, kind, chat_id, payload, attempts in cursor.fetchall()]
+    
+    def reschedule_outbox(self, op_ids: list, next_attempt: float, error: str, count_attempt: bool = True):
+        """Push operations back to next_attempt, counting a failed attempt unless deferred"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE outbox SET attempts = attempts + ?, next_attempt = ?, last_error = ?
+                WHERE id = ?
+            ''', [(int(count_attempt), next_attempt, error, op_id) for op_id in op_ids])
+            conn.commit()
+    
+    def remove_outbox(self, op_id: int):
+        """Drop a finished or abandoned operation"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM outbox WHERE id = ?', (op_id,))
+            conn.commit()
+    
+    def is_delivery_pending(self, chat_id: int) -> bool:
+        """Check whether deliveries to a chat are still waiting in the outbox"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM outbox WHERE chat_id = ? AND kind = ?', (chat_id, 'deliver_file'))
+            return cursor.fetchone() is not None
+    
+    def is_upload_pending(self, file_code: str) -> bool:
+        """Check whether an upload with this code is still waiting in the outbox"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM outbox WHERE file_code = ? AND kind = ?', (file_code, 'store_upload'))
+            return cursor.fetchone() is not None
+    
+    def get_pending_upload_codes(self) -> list:
+        """Get the share codes of uploads still waiting in the outbox"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT file_code FROM outbox WHERE kind = ?', ('store_upload',))
+            return [row[0] for row in cursor.fetchall()]
+    
+    def get_codes_since(self, file_rowid: int, batch_seq: int) -> Tuple[list, int, int]:
+        """Get file codes and batch ids inserted after the given file rowid and batch sequence
+        
+        Returns (codes, last file rowid, last batch sequence)
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, file_code FROM files WHERE id > ?', (file_rowid,))
+            files = cursor.fetchall()
+            cursor.execute('SELECT seq, batch_id FROM batch_sequence WHERE seq > ?', (batch_seq,))
+            batches = cursor.fetchall()
+        
+        codes = [code for _, code in files] + [code for _, code in batches]
+        return (codes,
+                max((rowid for rowid, _ in files), default=file_rowid),
+                max((seq for seq, _ in batches), default=batch_seq))
+    
+    def search_files(self, query: str, limit: int = 20) -> list:
+        """Prefix search over file and batch names, best matches first
+        
+        Returns (code, name, kind) tuples where kind is 'file' or 'batch'
+        """
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return []
+        # Every word must match as a prefix, e.g. "nar ep" -> "nar"* "ep"*
+        match = ' '.join(f'"{term}"*' for term in terms)
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            # Only the newest matches are ranked, so common words stay fast
+            # on very large tables
+            cursor.execute('''
+                SELECT code, name, kind FROM (
+                    SELECT f.file_code AS code, f.file_name AS name, 'file' AS kind, m.rank AS rank
+                    FROM (
+                        SELECT rowid, rank FROM files_fts WHERE files_fts MATCH ?
+                        ORDER BY rowid DESC LIMIT ?
+                    ) m JOIN files f ON f.id = m.rowid
+                    UNION ALL
+                    SELECT b.batch_id, b.batch_name, 'batch', m.rank
+                    FROM (
+                        SELECT rowid, rank FROM batch_groups_fts WHERE batch_groups_fts MATCH ?
+                        ORDER BY rowid DESC LIMIT ?
+                    ) m JOIN batch_groups b ON b.rowid = m.rowid
+                )
+                ORDER BY rank LIMIT ?
+            ''', (match, SEARCH_CANDIDATES, match, SEARCH_CANDIDATES, limit))
+            return cursor.fetchall()
+    
+    def get_recent_batch_ids(self, limit: int) -> list:
+        """Get the most recently created batch ids"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT batch_id FROM batch_groups
+                ORDER BY creation_date DESC LIMIT ?
+            ''', (limit,))
+            return [row[0] for row in cursor.fetchall()]
+    
+    def record_access(self, code: str, is_batch: bool = False):
+        """Remember a delivery; written to last_access by flush_access()"""
+        (self._accessed_batches if is_batch else self._accessed_files).add(code)
+    
+    def flush_access(self) -> int:
+        """Write buffered access times and return how many codes were updated"""
+        files, self._accessed_files = self._accessed_files, set()
+        batches, self._accessed_batches = self._accessed_batches, set()
+        if not files and not batches:
+            return 0
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('UPDATE files SET last_access = CURRENT_TIMESTAMP WHERE file_code = ?',
+                               [(code,) for code in files])
+            cursor.executemany('UPDATE batch_groups SET last_access = CURRENT_TIMESTAMP WHERE batch_id = ?',
+                               [(code,) for code in batches])
+            conn.commit()
+        return len(files) + len(batches)
+    
+    def archive_cold_data(self, days: int, chunk_size: int = 2000, pause: float = 0.01) -> Tuple[int, list]:
+        """Move files and batches not accessed for `days` days to the archive
+        
+        Rows move in transactions of about chunk_size files (a batch is never
+        split), with a pause in between, so writers on the event loop only wait
+        for one chunk. Returns (number of files moved, archived batch ids)
+        """
+        with self._archive_connect() as conn:
+            cursor = conn.cursor()
+            # Fixed once, so every chunk applies the same cutoff
+            cursor.execute("SELECT datetime('now', ?)", (f'-{days} days',))
+            cutoff = cursor.fetchone()[0]
+            
+            cursor.execute('''
+                SELECT batch_id FROM main.batch_groups
+                WHERE COALESCE(last_access, creation_date) < ?
+            ''', (cutoff,))
+            candidates = [row[0] for row in cursor.fetchall()]
+            
+            # Standalone files, selected and moved under the same write lock
+            files_moved = 0
+            while True:
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('''
+                    SELECT id FROM main.files
+                    WHERE batch_id IS NULL AND COALESCE(last_access, upload_date) < ?
+                    LIMIT ?
+                ''', (cutoff, chunk_size))
+                ids = [row[0] for row in cursor.fetchall()]
+                if ids:
+                    placeholders = ", ".join("?" for _ in ids)
+                    cursor.execute(f'''
+                        INSERT OR REPLACE INTO archive.files ({FILE_COLUMNS})
+                        SELECT {FILE_COLUMNS} FROM main.files WHERE id IN ({placeholders})
+                    ''', ids)
+                    cursor.execute(f'DELETE FROM main.files WHERE id IN ({placeholders})', ids)
+                    files_moved += len(ids)
+                conn.commit()
+                if len(ids) < chunk_size:
+                    break
+                time.sleep(pause)
+            
+            # Batches move together with their files
+            batch_ids = []
+            moved_in_chunk = 0
+            cursor.execute('BEGIN IMMEDIATE')
+            for batch_id in candidates:
+                # Skip batches accessed since the candidates were listed
+                cursor.execute('''
+                    SELECT 1 FROM main.batch_groups
+                    WHERE batch_id = ? AND COALESCE(last_access, creation_date) < ?
+                ''', (batch_id, cutoff))
+                if not cursor.fetchone():
+                    continue
+                cursor.execute(f'''
+                    INSERT OR REPLACE INTO archive.files ({FILE_COLUMNS})
+                    SELECT {FILE_COLUMNS} FROM main.files WHERE batch_id = ?
+                ''', (batch_id,))
+                files_moved += cursor.rowcount
+                moved_in_chunk += cursor.rowcount
+                cursor.execute('DELETE FROM main.files WHERE batch_id = ?', (batch_id,))
+                cursor.execute(f'''
+                    INSERT OR REPLACE INTO archive.batch_groups ({BATCH_COLUMNS})
+                    SELECT {BATCH_COLUMNS} FROM main.batch_groups WHERE batch_id = ?
+                ''', (batch_id,))
+                cursor.execute('DELETE FROM main.batch_groups WHERE batch_id = ?', (batch_id,))
+                batch_ids.append(batch_id)
+                
+                if moved_in_chunk >= chunk_size:
+                    conn.commit()
+                    moved_in_chunk = 0
+                    time.sleep(pause)
+                    cursor.execute('BEGIN IMMEDIATE')
+            conn.commit()
+        
+        return files_moved, batch_ids
+    
+    def restore_archived(self, code: str) -> bool:
+        """Move an archived file or batch back to the hot tables; False if not archived"""
+        if not os.path.exists(self.archive_path):
+            return False
+        
+        with self._archive_connect() as conn:
+            cursor = conn.cursor()
+            
+            # A code is either a batch id or a file code (whose whole batch comes back)
+            cursor.execute('SELECT batch_id FROM archive.files WHERE file_code = ?', (code,))
+            row = cursor.fetchone()
+            if row:
+                batch_id = row[0]
+            else:
+                cursor.execute('SELECT batch_id FROM archive.batch_groups WHERE batch_id = ?', (code,))
+                row = cursor.fetchone()
+                if not row:
+                    return False
+                batch_id = row[0]
+            
+            if batch_id:
+                cursor.execute(f'''
+                    INSERT OR IGNORE INTO main.batch_groups ({BATCH_COLUMNS})
+                    SELECT {BATCH_COLUMNS} FROM archive.batch_groups WHERE batch_id = ?
+                ''', (batch_id,))
+                cursor.execute('''
+                    UPDATE main.batch_groups SET last_access = CURRENT_TIMESTAMP WHERE batch_id = ?
+                ''', (batch_id,))
+                cursor.execute('DELETE FROM archive.batch_groups WHERE batch_id = ?', (batch_id,))
+                where, key = 'batch_id = ?', batch_id
+            else:
+                where, key = 'file_code = ?', code
+            
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO main.files ({FILE_COLUMNS})
+                SELECT {FILE_COLUMNS} FROM archive.files WHERE {where}
+            ''', (key,))
+            cursor.execute(f'UPDATE main.files SET last_access = CURRENT_TIMESTAMP WHERE {where}', (key,))
+            cursor.execute(f'DELETE FROM archive.files WHERE {where}', (key,))
+            conn.commit()
+        
+        return True
+    
+    def get_archived_codes(self) -> list:
+        """Get every archived file code and batch id"""
+        if not os.path.exists(self.archive_path):
+            return []
+        with self._archive_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT file_code FROM archive.files')
+            codes = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT batch_id FROM archive.batch_groups')
+            return codes + [row[0] for row in cursor.fetchall()]
+    
+    def get_reindex_checkpoint(self, channel_id: int) -> int:
+        """Get the last message id reindexed from a storage channel (0 if never)"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT last_message_id FROM reindex_checkpoints WHERE channel_id = ?',
+                           (channel_id,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
+    
+    def claim_legacy_files(self, channel_id: int) -> int:
+        """Give rows stored before the channel pool (NULL channel) an explicit channel id
+        
+        Only call this with STORAGE_CHANNEL_ID, the channel those rows live in.
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE files SET storage_channel_id = ? WHERE storage_channel_id IS NULL',
+                           (channel_id,))
+            claimed = cursor.rowcount
+            conn.commit()
+        if os.path.exists(self.archive_path):
+            with self._archive_connect() as conn:
+                conn.execute('''
+                    UPDATE archive.files SET storage_channel_id = ? WHERE storage_channel_id IS NULL
+                ''', (channel_id,))
+                conn.commit()
+        return claimed
+    
+    def _unique_codes(self, cursor: sqlite3.Cursor, count: int, archived: bool) -> list:
+        """Generate `count` short codes not used by any file, batch or pending
+        upload (they share one link namespace); at bulk sizes 8-character codes
+        would otherwise collide"""
+        codes = set()
+        while len(codes) < count:
+            candidates = {str(uuid.uuid4())[:8] for _ in range(count - len(codes))} - codes
+            columns = [("main.files", "file_code"), ("main.batch_groups", "batch_id"),
+                       ("main.outbox", "file_code")]
+            if archived:
+                columns += [("archive.files", "file_code"), ("archive.batch_groups", "batch_id")]
+            for table, column in columns:
+                if not candidates:
+                    break
+                placeholders = ", ".join("?" for _ in candidates)
+                cursor.execute(f'SELECT {column} FROM {table} WHERE {column} IN ({placeholders})',
+                               list(candidates))
+                candidates -= {row[0] for row in cursor.fetchall()}
+            codes |= candidates
+        return list(codes)
+    
+    def upsert_channel_files(self, channel_id: int, rows: list, uploaded_by: int,
+                             checkpoint: int) -> Tuple[int, int]:
+        """Insert or refresh files found in a storage channel, in one transaction
+        
+        rows are (message_id, file_id, file_name, file_type). Existing rows keep
+        their file_code so old share links stay valid; replicas and archived
+        messages are skipped. The checkpoint is saved in the same transaction.
+        Returns (inserted, updated).
+        """
+        archived = os.path.exists(self.archive_path)
+        new_codes = []
+        with (self._archive_connect() if archived else self._connect()) as conn:
+            cursor = conn.cursor()
+            
+            low = min((row[0] for row in rows), default=0)
+            high = max((row[0] for row in rows), default=0)
+            cursor.execute('''
+                SELECT message_id FROM main.file_replicas
+                WHERE channel_id = ? AND message_id BETWEEN ? AND ?
+            ''', (channel_id, low, high))
+            skip = {row[0] for row in cursor.fetchall()}
+            if archived:
+                cursor.execute('''
+                    SELECT message_id FROM archive.files
+                    WHERE storage_channel_id = ? AND message_id BETWEEN ? AND ?
+                ''', (channel_id, low, high))
+                skip.update(row[0] for row in cursor.fetchall())
+            cursor.execute('''
+                SELECT message_id FROM main.files
+                WHERE storage_channel_id = ? AND message_id BETWEEN ? AND ?
+            ''', (channel_id, low, high))
+            existing = {row[0] for row in cursor.fetchall()}
+            
+            rows = [row for row in rows if row[0] not in skip]
+            codes = self._unique_codes(cursor, len(rows), archived)
+            values = []
+            for (message_id, file_id, file_name, file_type), file_code in zip(rows, codes):
+                if message_id not in existing:
+                    new_codes.append(file_code)
+                values.append((file_code, file_id, file_name, file_type, message_id,
+                               uploaded_by, channel_id))
+            cursor.executemany('''
+                INSERT INTO main.files (file_code, file_id, file_name, file_type,
+                                        message_id, uploaded_by, storage_channel_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (storage_channel_id, message_id) DO UPDATE SET
+                    file_id = excluded.file_id,
+                    file_name = excluded.file_name,
+                    file_type = excluded.file_type
+            ''', values)
+            
+            cursor.execute('''
+                INSERT INTO main.reindex_checkpoints (channel_id, last_message_id, indexed)
+                VALUES (?, ?, ?)
+                ON CONFLICT (channel_id) DO UPDATE SET
+                    last_message_id = MAX(last_message_id, excluded.last_message_id),
+                    indexed = indexed + excluded.indexed,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (channel_id, checkpoint, len(values)))
+            conn.commit()
+        
+        for file_code in new_codes:
+            self._notify_code(file_code)
+        return len(new_codes), len(values) - len(new_codes)
+    
+    def set_user_language(self, user_id: int, language: str):
+        """Remember the reply language a user picked"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT OR REPLACE INTO user_languages (user_id, language) VALUES (?, ?)',
+                           (user_id, language))
+            conn.commit()
+    
+    def get_user_languages(self) -> dict:
+        """Get every picked language as {user_id: language}"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id, language FROM user_languages')
+            return dict(cursor.fetchall())
+    
     def ban_user(self, user_id: int, banned_by: int):
         """Ban a user"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO banned_users (user_id, banned_by)
                 VALUES (?, ?)
             ''', (user_id, banned_by))
             conn.commit()
+        if self._banned is not None:
+            self._banned.add(user_id)
     
     def unban_user(self, user_id: int):
         """Unban a user"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM banned_users WHERE user_id = ?', (user_id,))
             conn.commit()
+        if self._banned is not None:
+            self._banned.discard(user_id)
+    
+    def load_banned_users(self) -> set:
+        """Reload the in-memory set of banned user ids"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id FROM banned_users')
+            banned = {row[0] for row in cursor.fetchall()}
+        self._banned = banned
+        self._banned_loaded_at = time.monotonic()
+        return banned
     
     def is_user_banned(self, user_id: int) -> bool:
         """Check if user is banned"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT 1 FROM banned_users WHERE user_id = ?', (user_id,))
-            return cursor.fetchone() is not None
+        if self._banned is None or time.monotonic() - self._banned_loaded_at > self.ban_cache_ttl:
+            self.load_banned_users()
+        return user_id in self._banned
     
     def get_file_stats(self) -> dict:
         """Get database statistics"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('SELECT COUNT(*) FROM files')
@@ -142,8 +959,23 @@ class Database:
             cursor.execute('SELECT COUNT(*) FROM batch_groups')
             total_batches = cursor.fetchone()[0]
             
-            return {
-                "total_files": total_files,
-                "total_banned": total_banned,
-                "total_batches": total_batches
-            }
+            cursor.execute('SELECT COUNT(*) FROM outbox')
+            outbox = cursor.fetchone()[0]
+        
+        archived_files = archived_batches = 0
+        if os.path.exists(self.archive_path):
+            with self._archive_connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT COUNT(*) FROM archive.files')
+                archived_files = cursor.fetchone()[0]
+                cursor.execute('SELECT COUNT(*) FROM archive.batch_groups')
+                archived_batches = cursor.fetchone()[0]
+        
+        return {
+            "total_files": total_files,
+            "total_banned": total_banned,
+            "total_batches": total_batches,
+            "archived_files": archived_files,
+            "archived_batches": archived_batches,
+            "outbox": outbox
+        }
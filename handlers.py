@@ -1,30 +1,164 @@
-from telegram import Update, Bot, CallbackQuery
+from telegram import (
+    Update, Bot, CallbackQuery, Message,
+    InlineQueryResultArticle, InputTextMessageContent,
+    InlineKeyboardButton, InlineKeyboardMarkup
+)
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
 import logging
 import asyncio
-from typing import Tuple
+import time
+import uuid
+from typing import Optional, Tuple
 
 from database import Database
+from state import MemoryStateBackend, StateBackend
+from plans import DeliveryPlan, PlanCache
+from lifecycle import LifecycleManager
+from bloom import CodeIndex
+from profiler import SamplingProfiler
+from reindex import Reindexer, TelegramChannelHistory, format_stats
+from render import Renderer
+from outbox import Outbox, OutboxOp
 from config import *
 from utils import (
     check_channel_membership, 
-    create_channel_join_keyboard, 
+    extract_media,
     generate_share_link,
-    get_file_type,
     is_admin,
     log_user_action,
     schedule_file_deletion,
+    storage_channel_order,
     extract_user_id
 )
 
 logger = logging.getLogger(__name__)
 
 class BotHandlers:
-    def __init__(self, database: Database):
+    def __init__(self, database: Database, state: StateBackend = None,
+                 lifecycle: LifecycleManager = None, worker_index: int = 0):
         self.db = database
-        self.batch_mode = {}  # Store batch mode state per user
-        self.pending_batches = {}  # Store files for batch upload
+        self.worker_index = worker_index
+        self.lifecycle = lifecycle or LifecycleManager(SHUTDOWN_DRAIN_TIMEOUT)
+        # Batch mode flags and pending batch files live in the state backend
+        # so any worker can continue a batch started on another one
+        self.state = state or MemoryStateBackend()
+        # Compiled fan-out plans for hot batch links
+        self.plans = PlanCache(PLAN_CACHE_SIZE, PLAN_CACHE_TTL)
+        # Bloom filter of valid codes, built by prewarm() and fed by every insert
+        self.codes = CodeIndex(database, CODE_FILTER_ERROR_RATE, CODE_FILTER_SYNC_INTERVAL)
+        database.code_listeners.append(self.codes.add)
+        # Only installs hooks while a /profile window is running
+        self.profiler = SamplingProfiler()
+        self.reindexing = False
+        # Precompiled reply templates and memoized join keyboards
+        self.render = Renderer(MESSAGES, REQUIRED_CHANNELS, DEFAULT_LANGUAGE, KEYBOARD_CACHE_SIZE)
+        # Languages picked with /language, loaded by prewarm()
+        self.languages = {}
+        # Storage copies and deliveries that failed (or were deferred) and await a retry
+        self.outbox = Outbox(database, worker_index, OUTBOX_BASE_DELAY, OUTBOX_MAX_DELAY, OUTBOX_MAX_ATTEMPTS)
+        self._outbox_running = False
+    
+    def _language(self, user) -> str:
+        """The language picked with /language, else the user's Telegram client language"""
+        return self.languages.get(user.id) or self.render.language_for(user.language_code)
+    
+    def _text(self, user, key: str, **values) -> str:
+        """Render a reply in the user's language"""
+        return self.render.text(self._language(user), key, **values)
+    
+    def _in_batch_mode(self, user_id: int) -> bool:
+        """Check if user is currently collecting a batch"""
+        return bool(self.state.get(f"batch_mode:{user_id}"))
+    
+    async def store_in_channel(self, bot: Bot, from_chat_id: int, message_id: int) -> Tuple[int, Message]:
+        """Copy an upload into the storage pool, failing over to the next channel on error"""
+        last_error = None
+        for channel_id in storage_channel_order():
+            try:
+                stored = await bot.copy_message(
+                    chat_id=channel_id,
+                    from_chat_id=from_chat_id,
+                    message_id=message_id
+                )
+                return channel_id, stored
+            except TelegramError as e:
+                logger.error(f"Error storing message in channel {channel_id}: {e}")
+                last_error = e
+        raise last_error
+    
+    async def copy_from_storage(self, bot: Bot, chat_id: int, file_code: str,
+                                storage_channel_id: int, message_id: int) -> Message:
+        """Copy a stored file to chat_id, falling back to replicas if the primary copy fails"""
+        try:
+            return await bot.copy_message(
+                chat_id=chat_id,
+                from_chat_id=storage_channel_id or STORAGE_CHANNEL_ID,
+                message_id=message_id
+            )
+        except TelegramError as e:
+            logger.warning(f"Primary copy of {file_code} unavailable: {e}")
+            last_error = e
+        
+        for replica_channel_id, replica_message_id in self.db.get_file_replicas(file_code):
+            try:
+                return await bot.copy_message(
+                    chat_id=chat_id,
+                    from_chat_id=replica_channel_id,
+                    message_id=replica_message_id
+                )
+            except TelegramError as e:
+                logger.warning(f"Replica of {file_code} in {replica_channel_id} unavailable: {e}")
+                last_error = e
+        raise last_error
+    
+    async def replicate_files(self, context: ContextTypes.DEFAULT_TYPE):
+        """Background job: copy under-replicated files into other storage channels"""
+        copies = min(STORAGE_REPLICAS, len(STORAGE_CHANNEL_IDS))
+        pending = self.db.get_under_replicated_files(copies, REPLICATION_BATCH_SIZE)
+        
+        replicated = 0
+        for file_code, storage_channel_id, message_id, replica_channels, attempts in pending:
+            holders = {storage_channel_id or STORAGE_CHANNEL_ID, *replica_channels}
+            targets = [channel_id for channel_id in STORAGE_CHANNEL_IDS if channel_id not in holders]
+            
+            error = None
+            for channel_id in targets[:copies - len(holders)]:
+                try:
+                    # Falls back to an existing replica when the primary copy is gone
+                    replica = await self.copy_from_storage(
+                        context.bot, channel_id, file_code, storage_channel_id, message_id
+                    )
+                    self.db.add_file_replica(file_code, channel_id, replica.message_id)
+                    replicated += 1
+                except TelegramError as e:
+                    logger.error(f"Error replicating {file_code} to channel {channel_id}: {e}")
+                    error = e
+            
+            if error:
+                # Back off so files that keep failing do not fill every batch
+                delay = min(REPLICATION_MAX_DELAY, REPLICATION_INTERVAL * 2 ** attempts)
+                self.db.record_replication_failure(file_code, time.time() + delay, str(error))
+            elif attempts:
+                self.db.clear_replication_failure(file_code)
+        
+        if replicated:
+            logger.info(f"Replicated {replicated} file copies")
+    
+    async def flush_access_log(self, context: ContextTypes.DEFAULT_TYPE):
+        """Background job: write buffered last-access times"""
+        self.db.flush_access()
+    
+    async def archive_cold_files(self, context: ContextTypes.DEFAULT_TYPE):
+        """Background job: move files and batches idle for ARCHIVE_AFTER_DAYS to the archive"""
+        self.db.flush_access()
+        files_moved, batch_ids = await asyncio.to_thread(
+            self.db.archive_cold_data, ARCHIVE_AFTER_DAYS, ARCHIVE_CHUNK_SIZE, ARCHIVE_CHUNK_SLEEP
+        )
+        for batch_id in batch_ids:
+            self.plans.invalidate(batch_id)
+        if files_moved or batch_ids:
+            logger.info(f"Archived {files_moved} files and {len(batch_ids)} batches")
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -36,7 +170,7 @@ class BotHandlers:
         
         # Check if user is banned
         if self.db.is_user_banned(user_id):
-            await update.message.reply_text(MESSAGES["banned_user"])
+            await update.message.reply_text(self._text(user, "banned_user"))
             return
         
         log_user_action(user_id, username, "start_command")
@@ -47,7 +181,7 @@ class BotHandlers:
             await self.handle_file_request(update, context, file_code)
         else:
             # Send welcome message
-            await update.message.reply_text(MESSAGES["welcome"])
+            await update.message.reply_text(self._text(user, "welcome"))
     
     async def handle_file_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE, file_code: str):
         """Handle file request with code"""
@@ -57,30 +191,69 @@ class BotHandlers:
         
         log_user_action(user_id, username, f"file_request:{file_code}")
         
+        # Definitely-invalid codes (typos, scrapers) are rejected without any I/O
+        if not self.codes.might_exist(file_code):
+            await update.message.reply_text(self._text(user, "file_not_found"))
+            return
+        
         # Check channel membership first
         is_member, not_joined = await check_channel_membership(context.bot, user_id)
         
         if not is_member:
-            keyboard = create_channel_join_keyboard(not_joined, file_code)
+            keyboard = self.render.join_keyboard(self._language(user), not_joined, file_code)
             await update.message.reply_text(
-                MESSAGES["channel_join_required"],
+                self._text(user, "channel_join_required"),
                 reply_markup=keyboard
             )
             return
         
+        # Hot batches are served from their compiled plan without touching the database
+        plan = self.plans.get(file_code)
+        if plan:
+            await self.deliver_batch_files(update, context, plan, file_code)
+            return
+        
         # Check if it's a single file or batch
         file_data = self.db.get_file(file_code)
+        plan = None if file_data else self.compile_delivery_plan(file_code)
+        
+        if not file_data and not plan and self.db.restore_archived(file_code):
+            # Cold link: moved back from the archive on first access
+            file_data = self.db.get_file(file_code)
+            plan = None if file_data else self.compile_delivery_plan(file_code)
         
         if file_data:
             # Single file
             await self.deliver_single_file(update, context, file_data, file_code)
+        elif plan:
+            self.plans.record_miss()
+            await self.deliver_batch_files(update, context, plan, file_code)
+        elif self.db.is_upload_pending(file_code):
+            # Provisional link whose storage copy is still in the outbox
+            await update.message.reply_text(self._text(user, "file_processing"))
         else:
-            # Check if it's a batch
-            batch_files = self.db.get_batch_files(file_code)
-            if batch_files:
-                await self.deliver_batch_files(update, context, batch_files, file_code)
-            else:
-                await update.message.reply_text(MESSAGES["file_not_found"])
+            self.codes.record_false_positive()
+            await update.message.reply_text(self._text(user, "file_not_found"))
+    
+    def prewarm(self) -> dict:
+        """Load the caches the request path relies on (runs off the event loop at startup)"""
+        banned = self.db.load_banned_users()
+        self.languages.update(self.db.get_user_languages())
+        codes = self.codes.build()
+        plans = 0
+        for batch_id in self.db.get_recent_batch_ids(PREWARM_BATCHES):
+            if self.compile_delivery_plan(batch_id):
+                plans += 1
+        return {"banned": len(banned), "codes": codes, "plans": plans}
+    
+    def compile_delivery_plan(self, batch_id: str) -> Optional[DeliveryPlan]:
+        """Build the delivery plan for a batch and cache it, None if the batch is unknown"""
+        batch_files = self.db.get_batch_files(batch_id)
+        if not batch_files:
+            return None
+        plan = DeliveryPlan(batch_id, batch_files)
+        self.plans.put(plan)
+        return plan
     
     async def deliver_single_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE, file_data, file_code: str):
         """Deliver a single file to user"""
@@ -88,62 +261,259 @@ class BotHandlers:
         user_id = user.id
         username = user.username or "Unknown"
         
-        file_id, file_name, file_type, message_id, uploaded_by = file_data
+        file_id, file_name, file_type, message_id, uploaded_by, storage_channel_id = file_data
         
-        try:
-            # Forward the file from storage channel
-            sent_msg = await context.bot.copy_message(
-                chat_id=user_id,
-                from_chat_id=STORAGE_CHANNEL_ID,
-                message_id=message_id
-            )
-            
-            # Send delivery confirmation
-            await update.message.reply_text(MESSAGES["file_delivered"])
+        with self.lifecycle.in_flight():
+            try:
+                # Forward the file from storage channel
+                sent_msg = await self.copy_from_storage(
+                    context.bot, user_id, file_code, storage_channel_id, message_id
+                )
+            except TelegramError as e:
+                logger.error(f"Error delivering file {file_code} to user {user_id}: {e}")
+                if not Outbox.is_retryable(e):
+                    await update.message.reply_text(self._text(user, "error"))
+                    return
+                self.queue_deliveries(user, [(file_code, storage_channel_id, message_id)])
+                await update.message.reply_text(self._text(user, "delivery_queued"))
+                return
             
             # Schedule deletion after 5 minutes
-            asyncio.create_task(schedule_file_deletion(
-                context.bot, user_id, [sent_msg.message_id], 300
-            ))
-            
+            self.schedule_deletion(context.bot, user_id, [sent_msg.message_id], 300)
+            self.db.record_access(file_code)
             log_user_action(user_id, username, f"file_delivered:{file_code}")
-            
+        
+        # Send delivery confirmation; the file is already there, so a failure here is only logged
+        try:
+            await update.message.reply_text(self._text(user, "file_delivered"))
         except TelegramError as e:
-            logger.error(f"Error delivering file {file_code} to user {user_id}: {e}")
-            await update.message.reply_text(MESSAGES["error"])
+            logger.warning(f"Could not confirm delivery of {file_code} to user {user_id}: {e}")
     
-    async def deliver_batch_files(self, update: Update, context: ContextTypes.DEFAULT_TYPE, batch_files, file_code: str):
+    async def deliver_batch_files(self, update: Update, context: ContextTypes.DEFAULT_TYPE, plan: DeliveryPlan, file_code: str):
         """Deliver batch files to user"""
         user = update.effective_user
         user_id = user.id
         username = user.username or "Unknown"
         
         message_ids = []
+        queued = 0
+        error = None
+        
+        with self.lifecycle.in_flight():
+            try:
+                for index, (stored_file_code, storage_channel_id, message_id) in enumerate(plan.copies):
+                    try:
+                        sent_msg = await self.copy_from_storage(
+                            context.bot, user_id, stored_file_code, storage_channel_id, message_id
+                        )
+                    except TelegramError as e:
+                        logger.error(f"Error delivering batch {file_code} to user {user_id}: {e}")
+                        error = e
+                        if Outbox.is_retryable(e):
+                            # Files already sent are not queued again
+                            self.queue_deliveries(user, plan.copies[index:], batch_id=file_code)
+                            queued = len(plan) - index
+                        break
+                    message_ids.append(sent_msg.message_id)
+            finally:
+                # Schedule deletion after 5 minutes, including partially delivered batches
+                if message_ids:
+                    self.schedule_deletion(context.bot, user_id, message_ids, 300)
+            
+            if message_ids:
+                self.db.record_access(file_code, is_batch=True)
+                log_user_action(user_id, username, f"batch_delivered:{file_code}:{len(message_ids)}")
+        
+        if queued:
+            key = "delivery_queued"
+        elif error:
+            key = "error"
+        else:
+            # Send batch delivery confirmation
+            key = "batch_delivered"
+        try:
+            await update.message.reply_text(self._text(user, key))
+        except TelegramError as e:
+            logger.warning(f"Could not send batch {file_code} notice to user {user_id}: {e}")
+    
+    def queue_deliveries(self, user, files: list, batch_id: str = None):
+        """Put failed deliveries of (file_code, storage_channel_id, message_id) in the outbox"""
+        language = self._language(user)
+        delay = self.outbox.backoff(0)
+        for file_code, storage_channel_id, message_id in files:
+            self.outbox.enqueue("deliver_file", user.id, {
+                "file_code": file_code,
+                "storage_channel_id": storage_channel_id,
+                "message_id": message_id,
+                "batch_id": batch_id,
+                "language": language
+            }, delay=delay)
+    
+    async def queue_upload(self, update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str):
+        """Reply with a provisional share link at once; the storage copy runs in the outbox"""
+        user = update.effective_user
+        user_id = user.id
+        username = user.username or "Unknown"
         
         try:
-            for file_data in batch_files:
-                file_id, file_name, file_type, message_id, uploaded_by = file_data
-                
-                sent_msg = await context.bot.copy_message(
-                    chat_id=user_id,
-                    from_chat_id=STORAGE_CHANNEL_ID,
-                    message_id=message_id
-                )
-                message_ids.append(sent_msg.message_id)
-            
-            # Send batch delivery confirmation
-            await update.message.reply_text(MESSAGES["batch_delivered"])
-            
-            # Schedule deletion after 5 minutes
-            asyncio.create_task(schedule_file_deletion(
-                context.bot, user_id, message_ids, 300
-            ))
-            
-            log_user_action(user_id, username, f"batch_delivered:{file_code}:{len(batch_files)}")
+            file_obj, file_name, file_type = extract_media(update.message)
+            file_code = str(uuid.uuid4())[:8]
+            language = self._language(user)
+            share_link = generate_share_link(context.bot.username, file_code)
+            
+            # Committed before the link is shown, so a shown link is never lost
+            op_id = self.outbox.enqueue("store_upload", update.effective_chat.id, {
+                "file_code": file_code,
+                "from_chat_id": update.effective_chat.id,
+                "message_id": update.message.message_id,
+                "file_id": file_obj.file_id,
+                "file_name": file_name,
+                "file_type": file_type,
+                "uploaded_by": user_id,
+                "reply_message_id": None,
+                "language": language
+            }, file_code=file_code)
+            
+            reply = await update.message.reply_text(self.render.text(language, "file_queued", link=share_link))
+            # The confirmation edits this reply (a new message is sent if the copy ran first)
+            self.db.update_outbox_payload(op_id, {"reply_message_id": reply.message_id})
+            context.job_queue.run_once(self.process_outbox, 0)
+            
+            log_user_action(user_id, username, f"{kind}_queued:{file_code}")
             
+        except Exception as e:
+            logger.error(f"Error queueing {kind} from user {user_id}: {e}")
+            await update.message.reply_text(self._text(user, "error"))
+    
+    async def process_outbox(self, context: ContextTypes.DEFAULT_TYPE):
+        """Background job: run due outbox operations, one target chat at a time"""
+        if self._outbox_running:
+            return
+        self._outbox_running = True
+        try:
+            while self.lifecycle.accepting:
+                groups = self.outbox.due(OUTBOX_BATCH_SIZE)
+                if not groups:
+                    break
+                for chat_id, ops in groups.items():
+                    await self._run_outbox_group(context.bot, chat_id, ops)
+        finally:
+            self._outbox_running = False
+    
+    async def _run_outbox_group(self, bot: Bot, chat_id: int, ops: list):
+        delivered = []
+        delivered_payloads = []
+        with self.lifecycle.in_flight():
+            try:
+                for index, op in enumerate(ops):
+                    try:
+                        if op.kind == "store_upload":
+                            await self._store_upload(bot, op)
+                        else:
+                            payload = op.payload
+                            sent_msg = await self.copy_from_storage(
+                                bot, chat_id, payload["file_code"],
+                                payload["storage_channel_id"], payload["message_id"]
+                            )
+                            delivered.append(sent_msg.message_id)
+                            delivered_payloads.append(payload)
+                            if payload["batch_id"]:
+                                self.db.record_access(payload["batch_id"], is_batch=True)
+                            else:
+                                self.db.record_access(payload["file_code"])
+                        self.outbox.done(op)
+                    except Exception as e:
+                        # Database errors and bugs also go through attempts, backoff and dropping
+                        logger.warning(f"Outbox {op.kind} #{op.id} for chat {chat_id} failed: {e!r}")
+                        retry_at = self.outbox.failed(op, e)
+                        if retry_at is None:
+                            await self._notify_outbox_failure(bot, op)
+                            continue
+                        # The chat's other operations would most likely hit the same error
+                        self.outbox.defer(ops[index + 1:], retry_at, f"deferred after #{op.id}")
+                        break
+            finally:
+                if delivered:
+                    self.schedule_deletion(bot, chat_id, delivered, 300)
+        
+        if delivered:
+            # One notice per chat for everything delivered in this pass
+            if self.db.is_delivery_pending(chat_id):
+                # Deferred or not yet due; the pass that sends the last file says "all"
+                key = "delivery_continuing"
+            elif any(payload["batch_id"] for payload in delivered_payloads):
+                key = "batch_delivered"
+            else:
+                key = "file_delivered"
+            try:
+                await bot.send_message(chat_id, self.render.text(delivered_payloads[0]["language"], key))
+            except TelegramError as e:
+                logger.warning(f"Could not notify chat {chat_id} of queued delivery: {e}")
+    
+    async def _store_upload(self, bot: Bot, op: OutboxOp):
+        """Copy a queued upload into the storage pool, save it and confirm the link"""
+        payload = op.payload
+        # A previous attempt may have saved the file before the outbox row was removed
+        if not self.db.get_file(payload["file_code"]):
+            storage_channel_id, stored = await self.store_in_channel(
+                bot, payload["from_chat_id"], payload["message_id"]
+            )
+            self.db.save_file(
+                file_id=payload["file_id"],
+                file_name=payload["file_name"],
+                file_type=payload["file_type"],
+                message_id=stored.message_id,
+                uploaded_by=payload["uploaded_by"],
+                storage_channel_id=storage_channel_id,
+                file_code=payload["file_code"]
+            )
+        
+        share_link = generate_share_link(bot.username, payload["file_code"])
+        try:
+            await self._update_upload_reply(
+                bot, op, self.render.text(payload["language"], "file_uploaded", link=share_link)
+            )
+        except TelegramError as e:
+            logger.warning(f"Could not confirm upload {payload['file_code']}: {e}")
+    
+    async def _update_upload_reply(self, bot: Bot, op: OutboxOp, text: str):
+        """Replace the provisional link reply, or send text if it was not recorded yet"""
+        if op.payload["reply_message_id"] is None:
+            await bot.send_message(op.chat_id, text)
+        else:
+            await bot.edit_message_text(text, chat_id=op.chat_id, message_id=op.payload["reply_message_id"])
+    
+    async def _notify_outbox_failure(self, bot: Bot, op: OutboxOp):
+        payload = op.payload
+        try:
+            if op.kind == "store_upload":
+                share_link = generate_share_link(bot.username, payload["file_code"])
+                await self._update_upload_reply(
+                    bot, op, self.render.text(payload["language"], "upload_failed", link=share_link)
+                )
+            else:
+                await bot.send_message(op.chat_id, self.render.text(payload["language"], "error"))
         except TelegramError as e:
-            logger.error(f"Error delivering batch {file_code} to user {user_id}: {e}")
-            await update.message.reply_text(MESSAGES["error"])
+            logger.warning(f"Could not notify chat {op.chat_id} of dropped outbox #{op.id}: {e}")
+    
+    def schedule_deletion(self, bot: Bot, chat_id: int, message_ids: list, delay: int):
+        """Persist and schedule auto-deletion of delivered messages"""
+        delete_at = time.time() + delay
+        self.db.add_pending_deletions(chat_id, message_ids, delete_at, self.worker_index)
+        self.lifecycle.spawn(self._delete_later(bot, chat_id, message_ids, delete_at))
+    
+    async def _delete_later(self, bot: Bot, chat_id: int, message_ids: list, delete_at: float):
+        await schedule_file_deletion(bot, chat_id, message_ids, max(0, delete_at - time.time()))
+        self.db.remove_pending_deletions(chat_id, message_ids)
+    
+    def restore_pending_deletions(self, bot: Bot) -> int:
+        """Reschedule deletions persisted by a previous run of this worker"""
+        grouped = {}
+        for chat_id, message_id, delete_at in self.db.get_pending_deletions(self.worker_index):
+            grouped.setdefault((chat_id, delete_at), []).append(message_id)
+        for (chat_id, delete_at), message_ids in grouped.items():
+            self.lifecycle.spawn(self._delete_later(bot, chat_id, message_ids, delete_at))
+        return sum(len(message_ids) for message_ids in grouped.values())
     
     async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle document uploads from admin"""
@@ -153,55 +523,17 @@ class BotHandlers:
         
         # Check if user is admin
         if not is_admin(user_id):
-            await update.message.reply_text(MESSAGES["not_admin"])
+            await update.message.reply_text(self._text(user, "not_admin"))
             return
         
         log_user_action(user_id, username, "document_upload")
         
         # Check if in batch mode
-        if user_id in self.batch_mode:
+        if self._in_batch_mode(user_id):
             await self.add_file_to_batch(update, context, 'document')
             return
         
-        # Send processing message
-        processing_msg = await update.message.reply_text(MESSAGES["processing"])
-        
-        try:
-            document = update.message.document
-            file_name = document.file_name or "Unknown"
-            file_type = get_file_type(document)
-            file_id = document.file_id
-            
-            # Forward file to storage channel
-            forwarded = await context.bot.copy_message(
-                chat_id=STORAGE_CHANNEL_ID,
-                from_chat_id=update.effective_chat.id,
-                message_id=update.message.message_id
-            )
-            
-            # Save to database
-            file_code = self.db.save_file(
-                file_id=file_id,
-                file_name=file_name,
-                file_type=file_type,
-                message_id=forwarded.message_id,
-                uploaded_by=user_id
-            )
-            
-            # Generate share link
-            bot_info = await context.bot.get_me()
-            share_link = generate_share_link(bot_info.username, file_code)
-            
-            # Update processing message with success
-            await processing_msg.edit_text(
-                MESSAGES["file_uploaded"].format(link=share_link)
-            )
-            
-            log_user_action(user_id, username, f"document_uploaded:{file_code}")
-            
-        except Exception as e:
-            logger.error(f"Error processing document from user {user_id}: {e}")
-            await processing_msg.edit_text(MESSAGES["error"])
+        await self.queue_upload(update, context, 'document')
     
     async def handle_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle photo uploads from admin"""
@@ -210,53 +542,17 @@ class BotHandlers:
         username = user.username or "Unknown"
         
         if not is_admin(user_id):
-            await update.message.reply_text(MESSAGES["not_admin"])
+            await update.message.reply_text(self._text(user, "not_admin"))
             return
         
         log_user_action(user_id, username, "photo_upload")
         
         # Check if in batch mode
-        if user_id in self.batch_mode:
+        if self._in_batch_mode(user_id):
             await self.add_file_to_batch(update, context, 'photo')
             return
         
-        processing_msg = await update.message.reply_text(MESSAGES["processing"])
-        
-        try:
-            photo = update.message.photo[-1]  # Get highest quality
-            file_id = photo.file_id
-            file_name = f"photo_{photo.file_unique_id}.jpg"
-            file_type = "image/jpeg"
-            
-            # Forward to storage channel
-            forwarded = await context.bot.copy_message(
-                chat_id=STORAGE_CHANNEL_ID,
-                from_chat_id=update.effective_chat.id,
-                message_id=update.message.message_id
-            )
-            
-            # Save to database
-            file_code = self.db.save_file(
-                file_id=file_id,
-                file_name=file_name,
-                file_type=file_type,
-                message_id=forwarded.message_id,
-                uploaded_by=user_id
-            )
-            
-            # Generate share link
-            bot_info = await context.bot.get_me()
-            share_link = generate_share_link(bot_info.username, file_code)
-            
-            await processing_msg.edit_text(
-                MESSAGES["file_uploaded"].format(link=share_link)
-            )
-            
-            log_user_action(user_id, username, f"photo_uploaded:{file_code}")
-            
-        except Exception as e:
-            logger.error(f"Error processing photo from user {user_id}: {e}")
-            await processing_msg.edit_text(MESSAGES["error"])
+        await self.queue_upload(update, context, 'photo')
     
     async def handle_video(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle video uploads from admin"""
@@ -265,53 +561,17 @@ class BotHandlers:
         username = user.username or "Unknown"
         
         if not is_admin(user_id):
-            await update.message.reply_text(MESSAGES["not_admin"])
+            await update.message.reply_text(self._text(user, "not_admin"))
             return
         
         log_user_action(user_id, username, "video_upload")
         
         # Check if in batch mode
-        if user_id in self.batch_mode:
+        if self._in_batch_mode(user_id):
             await self.add_file_to_batch(update, context, 'video')
             return
         
-        processing_msg = await update.message.reply_text(MESSAGES["processing"])
-        
-        try:
-            video = update.message.video
-            file_id = video.file_id
-            file_name = video.file_name or f"video_{video.file_unique_id}.mp4"
-            file_type = get_file_type(video)
-            
-            # Forward to storage channel
-            forwarded = await context.bot.copy_message(
-                chat_id=STORAGE_CHANNEL_ID,
-                from_chat_id=update.effective_chat.id,
-                message_id=update.message.message_id
-            )
-            
-            # Save to database
-            file_code = self.db.save_file(
-                file_id=file_id,
-                file_name=file_name,
-                file_type=file_type,
-                message_id=forwarded.message_id,
-                uploaded_by=user_id
-            )
-            
-            # Generate share link
-            bot_info = await context.bot.get_me()
-            share_link = generate_share_link(bot_info.username, file_code)
-            
-            await processing_msg.edit_text(
-                MESSAGES["file_uploaded"].format(link=share_link)
-            )
-            
-            log_user_action(user_id, username, f"video_uploaded:{file_code}")
-            
-        except Exception as e:
-            logger.error(f"Error processing video from user {user_id}: {e}")
-            await processing_msg.edit_text(MESSAGES["error"])
+        await self.queue_upload(update, context, 'video')
     
     async def handle_audio(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle audio uploads from admin"""
@@ -320,53 +580,17 @@ class BotHandlers:
         username = user.username or "Unknown"
         
         if not is_admin(user_id):
-            await update.message.reply_text(MESSAGES["not_admin"])
+            await update.message.reply_text(self._text(user, "not_admin"))
             return
         
         log_user_action(user_id, username, "audio_upload")
         
         # Check if in batch mode
-        if user_id in self.batch_mode:
+        if self._in_batch_mode(user_id):
             await self.add_file_to_batch(update, context, 'audio')
             return
         
-        processing_msg = await update.message.reply_text(MESSAGES["processing"])
-        
-        try:
-            audio = update.message.audio
-            file_id = audio.file_id
-            file_name = audio.file_name or f"audio_{audio.file_unique_id}.mp3"
-            file_type = get_file_type(audio)
-            
-            # Forward to storage channel
-            forwarded = await context.bot.copy_message(
-                chat_id=STORAGE_CHANNEL_ID,
-                from_chat_id=update.effective_chat.id,
-                message_id=update.message.message_id
-            )
-            
-            # Save to database
-            file_code = self.db.save_file(
-                file_id=file_id,
-                file_name=file_name,
-                file_type=file_type,
-                message_id=forwarded.message_id,
-                uploaded_by=user_id
-            )
-            
-            # Generate share link
-            bot_info = await context.bot.get_me()
-            share_link = generate_share_link(bot_info.username, file_code)
-            
-            await processing_msg.edit_text(
-                MESSAGES["file_uploaded"].format(link=share_link)
-            )
-            
-            log_user_action(user_id, username, f"audio_uploaded:{file_code}")
-            
-        except Exception as e:
-            logger.error(f"Error processing audio from user {user_id}: {e}")
-            await processing_msg.edit_text(MESSAGES["error"])
+        await self.queue_upload(update, context, 'audio')
     
     async def batch_start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start batch upload mode"""
@@ -374,53 +598,49 @@ class BotHandlers:
         user_id = user.id
         
         if not is_admin(user_id):
-            await update.message.reply_text(MESSAGES["not_admin"])
+            await update.message.reply_text(self._text(user, "not_admin"))
             return
         
-        self.batch_mode[user_id] = True
-        self.pending_batches[user_id] = []
+        self.state.set(f"batch_mode:{user_id}", True)
+        self.state.delete(f"batch_files:{user_id}")
         
-        await update.message.reply_text(MESSAGES["batch_mode_start"])
+        await update.message.reply_text(self._text(user, "batch_mode_start"))
     
     async def batch_end_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """End batch upload mode and create batch link"""
         user = update.effective_user
         user_id = user.id
         
-        if not is_admin(user_id) or user_id not in self.batch_mode:
+        if not is_admin(user_id) or not self._in_batch_mode(user_id):
             return
         
-        if user_id not in self.pending_batches or not self.pending_batches[user_id]:
+        # Only removed once the batch is saved, so a failed write loses nothing
+        pending_files = self.state.peek(f"batch_files:{user_id}")
+        if not pending_files:
             await update.message.reply_text("No files in batch!")
             return
         
-        # Create batch group
-        batch_name = f"Batch_{len(self.pending_batches[user_id])}_files"
-        batch_id = self.db.create_batch_group(batch_name, user_id)
-        
-        # Save all files with batch_id
-        file_count = 0
-        for file_info in self.pending_batches[user_id]:
-            self.db.save_file(
-                file_id=file_info['file_id'],
-                file_name=file_info['file_name'],
-                file_type=file_info['file_type'],
-                message_id=file_info['message_id'],
-                uploaded_by=user_id,
-                batch_id=batch_id
-            )
-            file_count += 1
+        # Create the batch group and save all its files in one transaction
+        batch_name = f"Batch_{len(pending_files)}_files"
+        try:
+            batch_id = self.db.save_batch(batch_name, user_id, pending_files)
+        except Exception as e:
+            logger.error(f"Error saving batch of user {user_id}: {e}")
+            # Still in batch mode with the same files, so /batch_end can be sent again
+            await update.message.reply_text(self._text(user, "error"))
+            return
+        file_count = len(pending_files)
+        self.plans.invalidate(batch_id)
         
         # Generate share link
-        bot_info = await context.bot.get_me()
-        share_link = generate_share_link(bot_info.username, batch_id)
+        share_link = generate_share_link(context.bot.username, batch_id)
         
         # Clean up
-        del self.batch_mode[user_id]
-        del self.pending_batches[user_id]
+        self.state.delete(f"batch_files:{user_id}")
+        self.state.delete(f"batch_mode:{user_id}")
         
         await update.message.reply_text(
-            MESSAGES["batch_uploaded"].format(count=file_count, link=share_link)
+            self._text(user, "batch_uploaded", count=file_count, link=share_link)
         )
     
     async def add_file_to_batch(self, update: Update, context: ContextTypes.DEFAULT_TYPE, file_type_name: str):
@@ -429,51 +649,33 @@ class BotHandlers:
         user_id = user.id
         
         try:
-            # Get file info based on type
-            file_obj = None
-            file_name = "Unknown"
-            
-            if file_type_name == 'document':
-                file_obj = update.message.document
-                file_name = file_obj.file_name or "Unknown"
-            elif file_type_name == 'photo':
-                file_obj = update.message.photo[-1]
-                file_name = f"photo_{file_obj.file_unique_id}.jpg"
-            elif file_type_name == 'video':
-                file_obj = update.message.video
-                file_name = file_obj.file_name or f"video_{file_obj.file_unique_id}.mp4"
-            elif file_type_name == 'audio':
-                file_obj = update.message.audio
-                file_name = file_obj.file_name or f"audio_{file_obj.file_unique_id}.mp3"
-            
-            if not file_obj:
+            media = extract_media(update.message)
+            if not media:
                 return
-            
-            file_type = get_file_type(file_obj)
+            file_obj, file_name, file_type = media
             file_id = file_obj.file_id
             
             # Forward file to storage channel
-            forwarded = await context.bot.copy_message(
-                chat_id=STORAGE_CHANNEL_ID,
-                from_chat_id=update.effective_chat.id,
-                message_id=update.message.message_id
+            storage_channel_id, forwarded = await self.store_in_channel(
+                context.bot, update.effective_chat.id, update.message.message_id
             )
             
             # Store in pending batch
-            self.pending_batches[user_id].append({
+            batch_size = self.state.append(f"batch_files:{user_id}", {
                 'file_id': file_id,
                 'file_name': file_name,
                 'file_type': file_type,
-                'message_id': forwarded.message_id
+                'message_id': forwarded.message_id,
+                'storage_channel_id': storage_channel_id
             })
             
             await update.message.reply_text(
-                f"✅ Added to batch ({len(self.pending_batches[user_id])} files)"
+                f"✅ Added to batch ({batch_size} files)"
             )
             
         except Exception as e:
             logger.error(f"Error adding file to batch: {e}")
-            await update.message.reply_text(MESSAGES["error"])
+            await update.message.reply_text(self._text(user, "error"))
     
     async def ban_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Ban a user"""
@@ -481,7 +683,7 @@ class BotHandlers:
         user_id = user.id
         
         if not is_admin(user_id):
-            await update.message.reply_text(MESSAGES["not_admin"])
+            await update.message.reply_text(self._text(user, "not_admin"))
             return
         
         if not context.args:
@@ -490,12 +692,12 @@ class BotHandlers:
         
         target_user_id = extract_user_id(context.args[0])
         if not target_user_id or target_user_id == 0:
-            await update.message.reply_text(MESSAGES["user_not_found"])
+            await update.message.reply_text(self._text(user, "user_not_found"))
             return
         
         self.db.ban_user(target_user_id, user_id)
         await update.message.reply_text(
-            MESSAGES["user_banned"].format(user_id=target_user_id)
+            self._text(user, "user_banned", user_id=target_user_id)
         )
     
     async def unban_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -504,7 +706,7 @@ class BotHandlers:
         user_id = user.id
         
         if not is_admin(user_id):
-            await update.message.reply_text(MESSAGES["not_admin"])
+            await update.message.reply_text(self._text(user, "not_admin"))
             return
         
         if not context.args:
@@ -513,14 +715,34 @@ class BotHandlers:
         
         target_user_id = extract_user_id(context.args[0])
         if not target_user_id or target_user_id == 0:
-            await update.message.reply_text(MESSAGES["user_not_found"])
+            await update.message.reply_text(self._text(user, "user_not_found"))
             return
         
         self.db.unban_user(target_user_id)
         await update.message.reply_text(
-            MESSAGES["user_unbanned"].format(user_id=target_user_id)
+            self._text(user, "user_unbanned", user_id=target_user_id)
         )
     
+    async def language_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Pick the reply language: /language [bn|en], or choose from buttons"""
+        user = update.effective_user
+        
+        if context.args and context.args[0].lower() in self.render.languages:
+            await self.set_language(update.message, user, context.args[0].lower())
+            return
+        
+        keyboard = InlineKeyboardMarkup([[
+            InlineKeyboardButton(LANGUAGE_NAMES.get(language, language), callback_data=f"lang_{language}")
+            for language in self.render.languages
+        ]])
+        await update.message.reply_text(self._text(user, "language_prompt"), reply_markup=keyboard)
+    
+    async def set_language(self, message: Message, user, language: str):
+        """Store a user's reply language and confirm in it"""
+        self.db.set_user_language(user.id, language)
+        self.languages[user.id] = language
+        await message.reply_text(self.render.text(language, "language_set"))
+    
     async def callback_query_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle callback queries (button presses)"""
         query = update.callback_query
@@ -540,6 +762,31 @@ class BotHandlers:
             context.args = [file_code]
             
             await self.handle_file_request(new_update, context, file_code)
+        
+        elif query.data.startswith("lang_"):
+            language = query.data[5:]
+            if language in self.render.languages:
+                await self.set_language(query.message, update.effective_user, language)
+    
+    async def inline_query_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Search uploaded files by name and answer with share links (admin only)"""
+        query = update.inline_query
+        
+        if not is_admin(query.from_user.id):
+            await query.answer([], cache_time=0, is_personal=True)
+            return
+        
+        results = []
+        for code, name, kind in self.db.search_files(query.query, INLINE_SEARCH_LIMIT):
+            share_link = generate_share_link(context.bot.username, code)
+            results.append(InlineQueryResultArticle(
+                id=code,
+                title=name or code,
+                description=f"{'📦 Batch' if kind == 'batch' else '📁 File'} · {share_link}",
+                input_message_content=InputTextMessageContent(share_link)
+            ))
+        
+        await query.answer(results, cache_time=0, is_personal=True)
     
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /stats command for admin"""
@@ -547,7 +794,7 @@ class BotHandlers:
         user_id = user.id
         
         if not is_admin(user_id):
-            await update.message.reply_text(MESSAGES["not_admin"])
+            await update.message.reply_text(self._text(user, "not_admin"))
             return
         
         stats = self.db.get_file_stats()
@@ -555,9 +802,109 @@ class BotHandlers:
         stats_text += f"📁 মোট ফাইল / Total Files: {stats['total_files']}\n"
         stats_text += f"🚫 ব্যান ইউজার / Banned Users: {stats['total_banned']}\n"
         stats_text += f"📦 ব্যাচ গ্রুপ / Batch Groups: {stats['total_batches']}\n"
+        stats_text += f"🗄️ আর্কাইভ / Archived: {stats['archived_files']} files, {stats['archived_batches']} batches\n"
+        stats_text += f"⚡ ক্যাশড ব্যাচ / Cached Batch Plans: {len(self.plans)} ({self.plans.hits} hits, {self.plans.misses} misses)\n"
+        stats_text += (
+            f"⌨️ কীবোর্ড ক্যাশ / Keyboard Cache: {self.render.cached_keyboards} "
+            f"({self.render.keyboard_hits} hits, {self.render.keyboard_misses} misses)\n"
+        )
+        stats_text += (
+            f"📮 আউটবক্স / Outbox: {stats['outbox']} pending "
+            f"({self.outbox.succeeded} sent, {self.outbox.abandoned} dropped)\n"
+        )
+        code_stats = self.codes.stats()
+        stats_text += (
+            f"🛡️ কোড ফিল্টার / Code Filter: {code_stats['codes']} codes, "
+            f"{code_stats['rejected']} rejected, {code_stats['false_positives']} false positives "
+            f"(observed FP rate {code_stats['observed_fp_rate']:.4%}, "
+            f"estimated {code_stats['estimated_fp_rate']:.4%})\n"
+        )
         
         await update.message.reply_text(stats_text)
     
+    async def reindex_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Rebuild the files index from a storage channel's messages (admin only)"""
+        user = update.effective_user
+        user_id = user.id
+        
+        if not is_admin(user_id):
+            await update.message.reply_text(self._text(user, "not_admin"))
+            return
+        
+        try:
+            channel_id = int(context.args[0]) if context.args else STORAGE_CHANNEL_ID
+            start_id = int(context.args[1]) if len(context.args) > 1 else None
+        except ValueError:
+            await update.message.reply_text("Usage: /reindex [channel_id] [start_message_id]")
+            return
+        
+        if not REINDEX_PROBE_CHAT_ID:
+            await update.message.reply_text("🔁 Set REINDEX_PROBE_CHAT_ID to a private scratch channel first")
+            return
+        
+        if self.reindexing:
+            await update.message.reply_text("🔁 A reindex is already running")
+            return
+        
+        await update.message.reply_text(f"🔁 Reindexing channel {channel_id}...")
+        # Progress is checkpointed with every batch, so shutdown may cancel it
+        self.reindexing = True
+        self.lifecycle.spawn(self._run_reindex(context.bot, update.effective_chat.id, channel_id, start_id,
+                                               self._text(user, "error")))
+    
+    async def _run_reindex(self, bot: Bot, chat_id: int, channel_id: int, start_id: Optional[int],
+                           error_text: str):
+        reindexer = Reindexer(self.db, REINDEX_BATCH_SIZE, REINDEX_CONCURRENCY * 4, REINDEX_MAX_GAP,
+                              STORAGE_CHANNEL_ID)
+        source = TelegramChannelHistory(bot, REINDEX_PROBE_CHAT_ID, REINDEX_CONCURRENCY)
+        try:
+            stats = await reindexer.run(
+                channel_id, source, ADMIN_USER_ID, start_id,
+                progress=lambda stats: logger.info(f"Reindex {format_stats(stats)}")
+            )
+        except Exception as e:
+            logger.error(f"Reindex of channel {channel_id} failed: {e}")
+            await bot.send_message(chat_id, error_text)
+            return
+        finally:
+            self.reindexing = False
+        await bot.send_message(chat_id, f"✅ Reindexed {format_stats(stats)}")
+    
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Profile this worker for a few seconds and report where time goes (admin only)"""
+        user = update.effective_user
+        user_id = user.id
+        
+        if not is_admin(user_id):
+            await update.message.reply_text(self._text(user, "not_admin"))
+            return
+        
+        try:
+            seconds = int(context.args[0]) if context.args else PROFILE_DEFAULT_SECONDS
+        except ValueError:
+            await update.message.reply_text("Usage: /profile <seconds>")
+            return
+        seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+        
+        if self.profiler.running:
+            await update.message.reply_text("⏱️ A profile is already running")
+            return
+        
+        await update.message.reply_text(f"⏱️ Profiling for {seconds}s...")
+        # Run in the background so the updates being profiled keep flowing
+        self.lifecycle.spawn(self._send_profile(context.bot, update.effective_chat.id, seconds,
+                                                self._text(user, "error")))
+    
+    async def _send_profile(self, bot: Bot, chat_id: int, seconds: int, error_text: str):
+        try:
+            report = await self.profiler.profile(seconds)
+        except Exception as e:
+            logger.error(f"Profiling failed: {e}")
+            await bot.send_message(chat_id, error_text)
+            return
+        # Telegram messages are limited to 4096 characters
+        await bot.send_message(chat_id, report[:4096])
+    
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors"""
         if update and update.effective_user:
@@ -7,5 +7,6 @@ def index():
 def run():
   app.run(host='0.0.0.0',port=8080)
 def keep_alive():  
-    t = Thread(target=run)
+    # Daemon, so the process exits once the bot or the worker router stops
+    t = Thread(target=run, daemon=True)
     t.start()
\ No newline at end of file
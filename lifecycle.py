@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class LifecycleManager:
+    """Track in-flight work so the bot can stop without losing deliveries"""
+
+    def __init__(self, drain_timeout: float):
+        self.drain_timeout = drain_timeout
+        self.accepting = True
+        self._in_flight = 0
+        self._tasks = set()
+        self._shutdown_callbacks = []
+
+    @contextmanager
+    def in_flight(self):
+        """Mark a delivery as running until the block exits"""
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Start a background task that is cancelled on shutdown
+
+        Only use this for work whose state is persisted elsewhere (e.g. pending
+        deletions), since shutdown does not wait for it to finish.
+        """
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def on_shutdown(self, callback: Callable[[], None]):
+        """Register a flush/close callback run after in-flight work drained"""
+        self._shutdown_callbacks.append(callback)
+
+    async def shutdown(self):
+        """Stop accepting work, drain in-flight deliveries and flush state"""
+        self.accepting = False
+
+        deadline = time.monotonic() + self.drain_timeout
+        while self._in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._in_flight:
+            logger.warning(f"Shutdown deadline reached with {self._in_flight} deliveries in flight")
+        else:
+            logger.info("All in-flight deliveries drained")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        for callback in self._shutdown_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in shutdown callback {callback!r}: {e}")
+
+        for handler in logging.getLogger().handlers:
+            handler.flush()
@@ -3,8 +3,27 @@
 Telegram File Sharing Bot with Admin Controls and Channel Membership Verification
 """
 
+import time
+
+_BOOT_STARTED = time.perf_counter()
+
 import logging
 import asyncio
+import threading
+
+from startup import StartupTimer
+
+# Configure logging before anything else can emit records
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO,
+    handlers=[
+        logging.FileHandler('bot.log'),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
 
 # Import telegram modules with error handling
 try:
@@ -13,49 +32,81 @@ try:
         CommandHandler, 
         MessageHandler, 
         CallbackQueryHandler,
+        InlineQueryHandler,
         filters
     )
-    print("Telegram imports successful!")
+    logger.info("Telegram imports successful!")
 except ImportError as e:
-    print(f"Import error: {e}")
+    logger.error(f"Import error: {e}")
     import sys
     sys.exit(1)
-from keep_alive import keep_alive
-
-keep_alive()
 
-from config import BOT_TOKEN, DATABASE_PATH
+from config import (
+    BOT_TOKEN, DATABASE_PATH, WORKER_COUNT, ALLOWED_UPDATES,
+    STATE_BACKEND, STATE_DB_PATH, REDIS_URL,
+    STORAGE_CHANNEL_IDS, REPLICATION_INTERVAL, BAN_CACHE_TTL,
+    SHUTDOWN_DRAIN_TIMEOUT, BACKUP_DIR, BACKUP_INTERVAL, BACKUP_KEEP,
+    BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP, BACKUP_MAX_RESTARTS, ARCHIVE_DATABASE_PATH,
+    ARCHIVE_INTERVAL, ACCESS_FLUSH_INTERVAL, OUTBOX_POLL_INTERVAL
+)
 from database import Database
-from handlers import BotHandlers
+from lifecycle import LifecycleManager
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+startup_timer = StartupTimer(_BOOT_STARTED)
+startup_timer.mark("imports")
 
-logger = logging.getLogger(__name__)
+def start_keep_alive():
+    """Import Flask and start the keep-alive server off the startup path"""
+    from keep_alive import keep_alive
+    keep_alive()
 
-def main():
-    """Main function to run the bot"""
-    logger.info("Starting Telegram File Sharing Bot...")
+def build_application(worker_index: int = 0) -> Application:
+    """Create the application with all handlers registered"""
+    from handlers import BotHandlers
+    from state import create_state_backend
+    startup_timer.mark("handler imports")
+    
+    # Initialize database (DDL only runs when the schema version changed)
+    database = Database(DATABASE_PATH, ban_cache_ttl=BAN_CACHE_TTL,
+                        archive_path=ARCHIVE_DATABASE_PATH)
+    startup_timer.mark("database" if database.schema_current else "database (migrated)")
+    
+    # Initialize shared state and handlers
+    state = create_state_backend(STATE_BACKEND, db_path=STATE_DB_PATH, redis_url=REDIS_URL)
+    lifecycle = LifecycleManager(SHUTDOWN_DRAIN_TIMEOUT)
+    lifecycle.on_shutdown(database.flush_access)
+    lifecycle.on_shutdown(state.close)
+    bot_handlers = BotHandlers(database, state, lifecycle, worker_index)
     
-    # Initialize database
-    database = Database(DATABASE_PATH)
+    async def post_init(application: Application):
+        # initialize() has fetched and cached the bot identity by now
+        startup_timer.mark("initialize")
+        logger.info(f"Startup breakdown (worker {worker_index}): {startup_timer.report()}")
+        restored = bot_handlers.restore_pending_deletions(application.bot)
+        if restored:
+            logger.info(f"Rescheduled {restored} pending message deletions")
+        application.create_task(prewarm_caches(bot_handlers))
     
-    # Initialize handlers
-    bot_handlers = BotHandlers(database)
+    async def post_stop(application: Application):
+        # Updates are no longer fetched; drain deliveries while the bot can still send
+        logger.info(f"Shutting down worker {worker_index}...")
+        await lifecycle.shutdown()
     
     # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
     
     # Add handlers
     application.add_handler(CommandHandler("start", bot_handlers.start_command))
+    application.add_handler(CommandHandler("language", bot_handlers.language_command))
     application.add_handler(CommandHandler("stats", bot_handlers.stats_command))
+    application.add_handler(CommandHandler("profile", bot_handlers.profile_command))
+    application.add_handler(CommandHandler("reindex", bot_handlers.reindex_command))
     application.add_handler(CommandHandler("batch_start", bot_handlers.batch_start_command))
     application.add_handler(CommandHandler("batch_end", bot_handlers.batch_end_command))
     application.add_handler(CommandHandler("ban", bot_handlers.ban_command))
@@ -64,6 +115,9 @@ def main():
     # Callback query handler
     application.add_handler(CallbackQueryHandler(bot_handlers.callback_query_handler))
     
+    # Inline search over uploaded files
+    application.add_handler(InlineQueryHandler(bot_handlers.inline_query_handler))
+    
     # File handlers
     application.add_handler(MessageHandler(filters.Document.ALL, bot_handlers.handle_document))
     application.add_handler(MessageHandler(filters.PHOTO, bot_handlers.handle_photo))
@@ -73,11 +127,72 @@ def main():
     # Error handler
     application.add_error_handler(bot_handlers.error_handler)
     
-    logger.info("Bot handlers registered successfully")
+    # Every worker buffers its own access times and retries its own outbox
+    application.job_queue.run_repeating(
+        bot_handlers.flush_access_log, interval=ACCESS_FLUSH_INTERVAL, first=ACCESS_FLUSH_INTERVAL
+    )
+    application.job_queue.run_repeating(
+        bot_handlers.process_outbox, interval=OUTBOX_POLL_INTERVAL, first=OUTBOX_POLL_INTERVAL
+    )
+    
+    # Background jobs run on the first worker only
+    if worker_index == 0 and len(STORAGE_CHANNEL_IDS) > 1:
+        application.job_queue.run_repeating(
+            bot_handlers.replicate_files, interval=REPLICATION_INTERVAL, first=60
+        )
+    if worker_index == 0 and ARCHIVE_INTERVAL > 0:
+        application.job_queue.run_repeating(
+            bot_handlers.archive_cold_files, interval=ARCHIVE_INTERVAL, first=300
+        )
+    if worker_index == 0 and BACKUP_INTERVAL > 0:
+        from backup import BackupManager
+        backups = BackupManager(DATABASE_PATH, BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES_PER_STEP,
+                                BACKUP_STEP_SLEEP, ARCHIVE_DATABASE_PATH, BACKUP_MAX_RESTARTS)
+        application.job_queue.run_repeating(
+            backups.scheduled_backup, interval=BACKUP_INTERVAL, first=BACKUP_INTERVAL
+        )
+    
+    startup_timer.mark("application")
+    logger.info(f"Bot handlers registered successfully (worker {worker_index})")
+    
+    return application
+
+async def prewarm_caches(bot_handlers):
+    """Load the ban set and hot batch plans without delaying the first update"""
+    started = time.perf_counter()
+    try:
+        warmed = await asyncio.to_thread(bot_handlers.prewarm)
+    except Exception as e:
+        logger.error(f"Cache pre-warm failed: {e}")
+        return
+    logger.info(
+        f"Caches pre-warmed in {time.perf_counter() - started:.3f}s: "
+        f"{warmed['banned']} banned users, {warmed['codes']} share codes, "
+        f"{warmed['plans']} batch plans"
+    )
+
+def main():
+    """Main function to run the bot"""
+    logger.info("Starting Telegram File Sharing Bot...")
+    
+    # Rows owned by workers removed since the last deployment go to the
+    # remaining ones before any worker loads its outbox and deletions
+    reassigned = Database(DATABASE_PATH).reassign_worker_rows(WORKER_COUNT)
+    if reassigned:
+        logger.info(f"Reassigned {reassigned} outbox operations and pending deletions to {WORKER_COUNT} workers")
+    
+    if WORKER_COUNT > 1:
+        # Webhook router fanning out to sharded worker processes
+        from workers import run_sharded
+        run_sharded(WORKER_COUNT)
+        return
+    
+    threading.Thread(target=start_keep_alive, name="keep-alive", daemon=True).start()
+    application = build_application()
     
     # Start the bot
     logger.info("Starting bot polling...")
-    application.run_polling(allowed_updates=["message", "callback_query"])
+    application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     try:
@@ -86,3 +201,5 @@ if __name__ == "__main__":
         logger.info("Bot stopped by user")
     except Exception as e:
         logger.error(f"Bot crashed with error: {e}")
+    finally:
+        logging.shutdown()
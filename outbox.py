@@ -0,0 +1,81 @@
+import logging
+import random
+import time
+from collections import namedtuple
+from typing import Optional
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+OutboxOp = namedtuple("OutboxOp", "id kind chat_id payload attempts")
+
+
+class Outbox:
+    """Durable queue of Bot API operations retried with exponential backoff
+
+    Operations are rows in the outbox table, so they survive restarts. Each
+    worker only runs the operations it queued itself (like pending deletions).
+    """
+
+    def __init__(self, database: Database, worker_index: int, base_delay: float,
+                 max_delay: float, max_attempts: int):
+        self.db = database
+        self.worker_index = worker_index
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.succeeded = 0
+        self.abandoned = 0
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """Blocked bots and rejected requests fail the same way on every attempt"""
+        return not isinstance(error, (Forbidden, BadRequest))
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt: exponential, capped, with equal jitter"""
+        delay = min(self.max_delay, self.base_delay * 2 ** attempts)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def enqueue(self, kind: str, chat_id: int, payload: dict, file_code: str = None,
+                delay: float = 0.0) -> int:
+        return self.db.add_outbox(kind, chat_id, payload, time.time() + delay, file_code, self.worker_index)
+
+    def due(self, limit: int) -> dict:
+        """Operations due now as {chat_id: [OutboxOp, ...]}, oldest first per chat"""
+        groups = {}
+        for row in self.db.get_due_outbox(limit, self.worker_index):
+            op = OutboxOp(*row)
+            groups.setdefault(op.chat_id, []).append(op)
+        return groups
+
+    def done(self, op: OutboxOp):
+        self.db.remove_outbox(op.id)
+        self.succeeded += 1
+
+    def failed(self, op: OutboxOp, error: Exception) -> Optional[float]:
+        """Record a failed attempt; returns the retry time, or None if the op was dropped
+
+        Errors other than Forbidden and BadRequest (including non-Telegram ones)
+        are retried until max_attempts.
+        """
+        if not self.is_retryable(error) or op.attempts + 1 >= self.max_attempts:
+            logger.error(f"Dropping outbox {op.kind} #{op.id} for chat {op.chat_id} "
+                         f"after {op.attempts + 1} attempts: {error}")
+            self.db.remove_outbox(op.id)
+            self.abandoned += 1
+            return None
+        if isinstance(error, RetryAfter):
+            delay = error.retry_after
+        else:
+            delay = self.backoff(op.attempts)
+        next_attempt = time.time() + delay
+        self.db.reschedule_outbox([op.id], next_attempt, repr(error))
+        return next_attempt
+
+    def defer(self, ops: list, next_attempt: float, reason: str):
+        """Push back operations that were not attempted, without counting an attempt"""
+        self.db.reschedule_outbox([op.id for op in ops], next_attempt, reason, count_attempt=False)
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Optional
+import threading
+import time
+
+from config import STORAGE_CHANNEL_ID
+
+
+class DeliveryPlan:
+    """Precompiled, immutable fan-out for one batch: parallel tuples of storage copies,
+    plus the (file_code, channel_id, message_id) triples deliveries iterate over"""
+    __slots__ = ("batch_id", "file_codes", "channel_ids", "message_ids", "file_types", "copies")
+
+    def __init__(self, batch_id: str, batch_files: list):
+        # Rows come from Database.get_batch_files
+        set_attr = object.__setattr__
+        set_attr(self, "batch_id", batch_id)
+        set_attr(self, "file_codes", tuple(row[6] for row in batch_files))
+        set_attr(self, "channel_ids", tuple(row[5] or STORAGE_CHANNEL_ID for row in batch_files))
+        set_attr(self, "message_ids", tuple(row[3] for row in batch_files))
+        set_attr(self, "file_types", tuple(row[2] for row in batch_files))
+        set_attr(self, "copies", tuple(zip(self.file_codes, self.channel_ids, self.message_ids)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DeliveryPlan is immutable")
+
+    def __len__(self) -> int:
+        return len(self.message_ids)
+
+
+class PlanCache:
+    """Size-bounded LRU cache of delivery plans keyed by batch id
+
+    Plans expire after `ttl` seconds, so a batch changed or archived by another
+    worker is served stale for at most that long.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, batch_id: str) -> Optional[DeliveryPlan]:
+        """The cached plan, or None; only hits are counted, see record_miss()"""
+        with self._lock:
+            entry = self._plans.get(batch_id)
+            if entry is None:
+                return None
+            plan, expires = entry
+            if expires <= time.monotonic():
+                del self._plans[batch_id]
+                return None
+            self._plans.move_to_end(batch_id)
+            self.hits += 1
+            return plan
+
+    def record_miss(self):
+        """Count a request for a batch that had to be compiled
+
+        Share codes of single files also reach get(), so a missing entry alone
+        is not a miss.
+        """
+        with self._lock:
+            self.misses += 1
+
+    def put(self, plan: DeliveryPlan):
+        with self._lock:
+            self._plans[plan.batch_id] = (plan, time.monotonic() + self.ttl)
+            self._plans.move_to_end(plan.batch_id)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+    def invalidate(self, batch_id: str):
+        """Drop a plan after its batch changed"""
+        with self._lock:
+            self._plans.pop(batch_id, None)
+
+    def __len__(self) -> int:
+        return len(self._plans)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SLOW_CALLBACK_PATTERN = re.compile(r"Executing (.+) took ([0-9.]+) seconds")
+CORO_PATTERN = re.compile(r"coro=<([^>]+)>")
+
+
+def _location(frame) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+
+def _is_repo_frame(frame) -> bool:
+    return frame.f_code.co_filename.startswith(REPO_DIR)
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Collect asyncio debug-mode 'Executing ... took N seconds' warnings"""
+
+    def __init__(self, sink: list):
+        super().__init__(logging.WARNING)
+        self.sink = sink
+
+    def emit(self, record: logging.LogRecord):
+        match = SLOW_CALLBACK_PATTERN.search(record.getMessage())
+        if match:
+            # Prefer the coroutine description over the full handle repr
+            coro = CORO_PATTERN.search(match.group(1))
+            self.sink.append((float(match.group(2)), (coro.group(1) if coro else match.group(1))[:120]))
+
+
+class SamplingProfiler:
+    """On-demand profiler for the event loop thread
+
+    While a window runs, a helper thread samples the loop thread's Python stack,
+    a loop callback samples what every pending task is awaiting, and asyncio
+    debug mode reports slow callbacks. Nothing is installed outside a window.
+    """
+
+    def __init__(self, interval: float = 0.005, task_interval: float = 0.05,
+                 slow_callback: float = 0.05):
+        self.interval = interval
+        self.task_interval = task_interval
+        self.slow_callback = slow_callback
+        self.running = False
+
+    async def profile(self, seconds: float) -> str:
+        """Profile the running loop for `seconds` and return a text report"""
+        if self.running:
+            raise RuntimeError("A profile is already running")
+        self.running = True
+
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+        profiling_task = asyncio.current_task()
+        stop = threading.Event()
+
+        samples = 0
+        idle = 0
+        leaf = Counter()
+        handlers = Counter()
+        db_calls = Counter()
+        awaits = Counter()
+        task_samples = 0
+        slow_callbacks = []
+
+        def sample_stacks():
+            nonlocal samples, idle
+            while not stop.wait(self.interval):
+                frame = sys._current_frames().get(loop_thread)
+                if frame is None:
+                    continue
+                samples += 1
+                if frame.f_code.co_name in ("select", "poll", "epoll", "_run_once") and not _is_repo_frame(frame):
+                    idle += 1
+                    continue
+                leaf[_location(frame)] += 1
+                seen_handler = seen_db = False
+                while frame is not None:
+                    name = os.path.basename(frame.f_code.co_filename)
+                    if name == "handlers.py" and not seen_handler:
+                        handlers[frame.f_code.co_name] += 1
+                        seen_handler = True
+                    elif name == "database.py" and not seen_db:
+                        db_calls[frame.f_code.co_name] += 1
+                        seen_db = True
+                    frame = frame.f_back
+
+        def sample_tasks():
+            nonlocal task_samples
+            if stop.is_set():
+                return
+            task_samples += 1
+            for task in asyncio.all_tasks(loop):
+                if task is profiling_task:
+                    continue
+                awaitable = task.get_coro()
+                repo_location = None
+                innermost = None
+                while awaitable is not None:
+                    frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+                    if frame is None:
+                        innermost = type(awaitable).__name__
+                        break
+                    if _is_repo_frame(frame):
+                        repo_location = _location(frame)
+                    innermost = getattr(awaitable, "__qualname__", _location(frame))
+                    awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+                if repo_location:
+                    awaits[f"{repo_location} -> {innermost}"] += 1
+            loop.call_later(self.task_interval, sample_tasks)
+
+        slow_handler = _SlowCallbackHandler(slow_callbacks)
+        asyncio_logger = logging.getLogger("asyncio")
+        previous_debug = loop.get_debug()
+        previous_slow = loop.slow_callback_duration
+
+        sampler = threading.Thread(target=sample_stacks, name="profiler", daemon=True)
+        started = time.perf_counter()
+        try:
+            asyncio_logger.addHandler(slow_handler)
+            loop.slow_callback_duration = self.slow_callback
+            loop.set_debug(True)
+            sampler.start()
+            loop.call_soon(sample_tasks)
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            loop.set_debug(previous_debug)
+            loop.slow_callback_duration = previous_slow
+            asyncio_logger.removeHandler(slow_handler)
+            sampler.join()
+            self.running = False
+
+        elapsed = time.perf_counter() - started
+        return self._report(elapsed, samples, idle, leaf, handlers, db_calls,
+                            awaits, task_samples, slow_callbacks)
+
+    def _report(self, elapsed, samples, idle, leaf, handlers, db_calls,
+                awaits, task_samples, slow_callbacks) -> str:
+        busy = samples - idle
+
+        def section(title: str, counter: Counter, total: int, unit: str):
+            lines = [title]
+            if not counter:
+                lines.append("  (none)")
+            for key, count in counter.most_common(8):
+                share = count / total if total else 0
+                lines.append(f"  {share:6.1%}  {key} ({count} {unit})")
+            return lines
+
+        lines = [
+            f"⏱️ Profile: {elapsed:.1f}s, {samples} stack samples, "
+            f"loop busy {busy / samples if samples else 0:.1%}",
+            "",
+        ]
+        lines += section("🔥 Hot functions (self time):", leaf, samples, "samples")
+        lines += [""] + section("🧩 Handlers (inclusive):", handlers, samples, "samples")
+        lines += [""] + section("🗄️ DB calls (inclusive):", db_calls, samples, "samples")
+        lines += [""] + section("⏳ Awaits (task samples):", awaits, task_samples, "samples")
+        lines += ["", f"🐢 Slow callbacks (>{self.slow_callback * 1000:.0f}ms): {len(slow_callbacks)}"]
+        for seconds, callback in sorted(slow_callbacks, reverse=True)[:5]:
+            lines.append(f"  {seconds * 1000:7.1f}ms  {callback}")
+        return "\n".join(lines)
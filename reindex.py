@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Rebuild the files index from what already sits in a storage channel.
+
+Messages are read in message id order from a history source, their media is
+extracted the same way uploads are, and rows are upserted in large
+transactions keyed on (storage_channel_id, message_id). A checkpoint saved
+with every transaction lets an interrupted run resume where it stopped.
+
+Usage: python reindex.py [channel_id] [start_id]
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from database import Database
+from utils import extract_media
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramChannelHistory:
+    """Read channel messages through the Bot API
+
+    Bots cannot fetch channel history, so each message id is forwarded to a
+    probe chat (which returns the full message) and the forward is deleted.
+    """
+
+    def __init__(self, bot: Bot, probe_chat_id: int, concurrency: int):
+        self.bot = bot
+        self.probe_chat_id = probe_chat_id
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _probe(self, channel_id: int, message_id: int):
+        async with self.semaphore:
+            while True:
+                try:
+                    message = await self.bot.forward_message(
+                        chat_id=self.probe_chat_id,
+                        from_chat_id=channel_id,
+                        message_id=message_id,
+                        disable_notification=True
+                    )
+                    break
+                except RetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+                except BadRequest:
+                    # Deleted, never existed or a service message
+                    return None
+                # Anything else (Forbidden, NetworkError) ends the run; Reindexer
+                # saves its checkpoint first so the next run resumes here
+            try:
+                await self.bot.delete_message(self.probe_chat_id, message.message_id)
+            except TelegramError as e:
+                logger.warning(f"Could not delete probe message {message.message_id}: {e}")
+            return message
+
+    async def fetch(self, channel_id: int, message_ids: list) -> list:
+        """Messages for message_ids, in order, with None for missing ones"""
+        return await asyncio.gather(*(self._probe(channel_id, message_id) for message_id in message_ids))
+
+
+class FakeChannelHistory:
+    """In-memory channel history for exercising the reindexer without Telegram"""
+
+    def __init__(self, messages: dict, latency: float = 0.0):
+        # {message_id: message}; message ids absent from the dict are gaps
+        self.messages = messages
+        self.latency = latency
+        self.fetched = 0
+
+    @staticmethod
+    def media_message(kind: str, file_name: str = None, mime_type: str = None):
+        """Build a message-like object carrying one document, photo, video or audio"""
+        media = SimpleNamespace(
+            file_id=f"fake-{kind}-{file_name}",
+            file_unique_id=f"u-{file_name}",
+            file_name=file_name,
+            mime_type=mime_type
+        )
+        message = SimpleNamespace(document=None, photo=None, video=None, audio=None)
+        setattr(message, kind, [media] if kind == "photo" else media)
+        return message
+
+    async def fetch(self, channel_id: int, message_ids: list) -> list:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.fetched += len(message_ids)
+        return [self.messages.get(message_id) for message_id in message_ids]
+
+
+class Reindexer:
+    """Scan a storage channel and upsert every media message into the files table"""
+
+    def __init__(self, database: Database, batch_size: int, window: int, max_gap: int,
+                 legacy_channel_id: int = None):
+        self.db = database
+        self.batch_size = batch_size
+        self.window = window
+        self.max_gap = max_gap
+        # Rows with a NULL storage_channel_id live in this channel (STORAGE_CHANNEL_ID)
+        self.legacy_channel_id = legacy_channel_id
+
+    async def run(self, channel_id: int, source, uploaded_by: int, start_id: int = None,
+                  end_id: int = None, progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """Scan from start_id (default: after the checkpoint) and return throughput stats
+
+        The scan stops at end_id, or after max_gap consecutive missing ids.
+        """
+        if channel_id == self.legacy_channel_id:
+            # Make legacy rows match the upsert key instead of being indexed twice
+            self.db.claim_legacy_files(channel_id)
+        next_id = start_id if start_id else self.db.get_reindex_checkpoint(channel_id) + 1
+        stats = {"channel_id": channel_id, "first_message_id": next_id, "last_message_id": next_id - 1,
+                 "scanned": 0, "media": 0, "inserted": 0, "updated": 0}
+        rows = []
+        gap = 0
+        started = time.perf_counter()
+
+        def commit():
+            inserted, updated = self.db.upsert_channel_files(
+                channel_id, rows, uploaded_by, stats["last_message_id"]
+            )
+            stats["inserted"] += inserted
+            stats["updated"] += updated
+            rows.clear()
+            stats["seconds"] = time.perf_counter() - started
+            stats["rate"] = stats["scanned"] / stats["seconds"] if stats["seconds"] else 0.0
+            if progress:
+                progress(stats)
+
+        while gap < self.max_gap and (end_id is None or next_id <= end_id):
+            last_id = next_id + self.window - 1 if end_id is None else min(next_id + self.window - 1, end_id)
+            message_ids = list(range(next_id, last_id + 1))
+            try:
+                messages = await source.fetch(channel_id, message_ids)
+            except TelegramError:
+                # Keep what earlier windows found; this window is scanned again
+                commit()
+                raise
+
+            for message_id, message in zip(message_ids, messages):
+                stats["scanned"] += 1
+                if message is None:
+                    gap += 1
+                    continue
+                gap = 0
+                stats["last_message_id"] = message_id
+                media = extract_media(message)
+                if media:
+                    file_obj, file_name, file_type = media
+                    rows.append((message_id, file_obj.file_id, file_name, file_type))
+                    stats["media"] += 1
+            next_id = last_id + 1
+
+            if len(rows) >= self.batch_size:
+                commit()
+
+        # Also saves the checkpoint when the tail had no media
+        commit()
+        return stats
+
+
+def format_stats(stats: dict) -> str:
+    return (
+        f"channel {stats['channel_id']}: scanned {stats['scanned']} messages "
+        f"({stats['first_message_id']}..{stats['last_message_id']}), {stats['media']} media, "
+        f"{stats['inserted']} new, {stats['updated']} refreshed in {stats['seconds']:.1f}s "
+        f"({stats['rate']:.0f} msg/s)"
+    )
+
+
+async def _reindex(channel_id: int, start_id: int) -> dict:
+    from config import (
+        BOT_TOKEN, ADMIN_USER_ID, DATABASE_PATH, ARCHIVE_DATABASE_PATH, REINDEX_PROBE_CHAT_ID,
+        REINDEX_BATCH_SIZE, REINDEX_CONCURRENCY, REINDEX_MAX_GAP, STORAGE_CHANNEL_ID
+    )
+
+    database = Database(DATABASE_PATH, archive_path=ARCHIVE_DATABASE_PATH)
+    reindexer = Reindexer(database, REINDEX_BATCH_SIZE, REINDEX_CONCURRENCY * 4, REINDEX_MAX_GAP,
+                          STORAGE_CHANNEL_ID)
+    if not REINDEX_PROBE_CHAT_ID:
+        raise SystemExit("Set REINDEX_PROBE_CHAT_ID to a private scratch chat the bot can post in")
+    async with Bot(BOT_TOKEN) as bot:
+        source = TelegramChannelHistory(bot, REINDEX_PROBE_CHAT_ID, REINDEX_CONCURRENCY)
+        return await reindexer.run(channel_id, source, ADMIN_USER_ID, start_id,
+                                   progress=lambda stats: logger.info(f"Reindex {format_stats(stats)}"))
+
+
+def main():
+    from config import STORAGE_CHANNEL_ID
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    try:
+        channel_id = int(sys.argv[1]) if len(sys.argv) > 1 else STORAGE_CHANNEL_ID
+        start_id = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    except ValueError:
+        print(__doc__)
+        sys.exit(1)
+
+    print(format_stats(asyncio.run(_reindex(channel_id, start_id))))
+
+
+if __name__ == "__main__":
+    main()
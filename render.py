@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from string import Formatter
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+class Renderer:
+    """Reply texts and join keyboards, compiled once per language at startup
+
+    Templates without fields are stored as final strings, the others as bound
+    format methods; every language must define the same keys and fields. Join
+    keyboards reuse one button per (language, channel) and are memoized in a
+    size-bounded LRU keyed by (language, missing channels, file code).
+    """
+
+    def __init__(self, templates: dict, channels: list, default_language: str,
+                 keyboard_cache_size: int):
+        self.default_language = default_language
+        self.languages = tuple(templates)
+        self._texts = {}
+        self._formats = {}
+        fields = {}
+        for language, messages in templates.items():
+            for key, template in messages.items():
+                names = frozenset(name for _, name, _, _ in Formatter().parse(template) if name is not None)
+                # A template missing or misspelling a field fails here, not mid-request
+                if fields.setdefault(key, names) != names:
+                    raise ValueError(f"Template {language}.{key} uses fields {sorted(names)}, "
+                                     f"expected {sorted(fields[key])}")
+                if names:
+                    self._formats[language, key] = template.format
+                else:
+                    # Also unescapes literal braces
+                    self._texts[language, key] = template.format()
+        for language, messages in templates.items():
+            missing = fields.keys() - messages.keys()
+            if missing:
+                raise ValueError(f"Templates for {language} are missing {sorted(missing)}")
+
+        # Telegram objects are immutable, so buttons can be shared by keyboards
+        self._join_buttons = {
+            (language, channel["url"]): InlineKeyboardButton(
+                self.text(language, "join_button", name=channel["name"]), url=channel["url"]
+            )
+            for language in self.languages
+            for channel in channels
+        }
+        self.keyboard_cache_size = keyboard_cache_size
+        self._keyboards = OrderedDict()
+        self.keyboard_hits = 0
+        self.keyboard_misses = 0
+
+    def language_for(self, language_code: Optional[str]) -> str:
+        """Map a Telegram language_code (e.g. "bn" or "en-US") to a supported language"""
+        language = (language_code or "").split("-")[0].lower()
+        return language if language in self.languages else self.default_language
+
+    def text(self, language: str, key: str, **values) -> str:
+        """Render a reply in `language`"""
+        text = self._texts.get((language, key))
+        if text is not None:
+            return text
+        return self._formats[language, key](**values)
+
+    def join_keyboard(self, language: str, not_joined: list, file_code: str = None) -> InlineKeyboardMarkup:
+        """Join buttons for the missing channels (2 per row) plus a retry button"""
+        key = (language, tuple(channel["url"] for channel in not_joined), file_code)
+        keyboard = self._keyboards.get(key)
+        if keyboard is not None:
+            self._keyboards.move_to_end(key)
+            self.keyboard_hits += 1
+            return keyboard
+        self.keyboard_misses += 1
+
+        buttons = [self._join_buttons[language, url] for url in key[1]]
+        rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+        if file_code:
+            rows.append([InlineKeyboardButton(self.text(language, "retry_button"),
+                                              callback_data=f"retry_{file_code}")])
+        keyboard = InlineKeyboardMarkup(rows)
+
+        self._keyboards[key] = keyboard
+        while len(self._keyboards) > self.keyboard_cache_size:
+            self._keyboards.popitem(last=False)
+        return keyboard
+
+    @property
+    def cached_keyboards(self) -> int:
+        return len(self._keyboards)
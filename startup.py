@@ -0,0 +1,26 @@
+import time
+
+
+class StartupTimer:
+    """Record how long each startup phase takes"""
+
+    def __init__(self, started_at: float = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.phases = []
+        self._last = self.started_at
+
+    def mark(self, phase: str):
+        """Close the current phase under the given name"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started_at
+
+    def report(self) -> str:
+        """One-line breakdown, e.g. 'imports 0.412s | database 0.003s | total 0.415s'"""
+        parts = [f"{phase} {seconds:.3f}s" for phase, seconds in self.phases]
+        parts.append(f"total {self.total:.3f}s")
+        return " | ".join(parts)
@@ -0,0 +1,205 @@
+import json
+import sqlite3
+import threading
+from typing import Any, Optional
+
+try:
+    import redis
+except ImportError:  # Optional: only needed for the multi-node backend
+    redis = None
+
+
+class StateBackend:
+    """Key/value store for session state shared between bot workers"""
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def append(self, key: str, value: Any) -> int:
+        """Append value to the list stored at key and return the new length"""
+        raise NotImplementedError
+
+    def peek(self, key: str) -> list:
+        """Return the items of the list stored at key without removing them"""
+        raise NotImplementedError
+
+    def pop(self, key: str) -> list:
+        """Remove the list stored at key and return its items"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """In-process state, only valid for a single worker"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._data.get(key)
+
+    def set(self, key: str, value: Any):
+        self._data[key] = value
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def append(self, key: str, value: Any) -> int:
+        with self._lock:
+            items = self._data.setdefault(key, [])
+            items.append(value)
+            return len(items)
+
+    def peek(self, key: str) -> list:
+        with self._lock:
+            return list(self._data.get(key) or [])
+
+    def pop(self, key: str) -> list:
+        with self._lock:
+            return self._data.pop(key, None) or []
+
+
+class SQLiteStateBackend(StateBackend):
+    """State stored in a WAL-mode SQLite file, shared by workers on one host"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout = 30000')
+        return conn
+
+    def init_db(self):
+        """Create the state table and switch the file to WAL mode"""
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS worker_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            ''')
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT value FROM worker_state WHERE key = ?', (key,)).fetchone()
+            return json.loads(row[0]) if row else None
+        finally:
+            conn.close()
+
+    def set(self, key: str, value: Any):
+        conn = self._connect()
+        try:
+            conn.execute('INSERT OR REPLACE INTO worker_state (key, value) VALUES (?, ?)',
+                         (key, json.dumps(value)))
+        finally:
+            conn.close()
+
+    def delete(self, key: str):
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM worker_state WHERE key = ?', (key,))
+        finally:
+            conn.close()
+
+    def append(self, key: str, value: Any) -> int:
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front so concurrent appends serialize
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT value FROM worker_state WHERE key = ?', (key,)).fetchone()
+            items = json.loads(row[0]) if row else []
+            items.append(value)
+            conn.execute('INSERT OR REPLACE INTO worker_state (key, value) VALUES (?, ?)',
+                         (key, json.dumps(items)))
+            conn.execute('COMMIT')
+            return len(items)
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def peek(self, key: str) -> list:
+        return self.get(key) or []
+
+    def pop(self, key: str) -> list:
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT value FROM worker_state WHERE key = ?', (key,)).fetchone()
+            conn.execute('DELETE FROM worker_state WHERE key = ?', (key,))
+            conn.execute('COMMIT')
+            return json.loads(row[0]) if row else []
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+
+class RedisStateBackend(StateBackend):
+    """State stored in any Redis-compatible server, shared by workers on many hosts"""
+
+    def __init__(self, url: str, prefix: str = "filebot:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for STATE_BACKEND=redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(self._key(key))
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any):
+        self.client.set(self._key(key), json.dumps(value))
+
+    def delete(self, key: str):
+        self.client.delete(self._key(key))
+
+    def append(self, key: str, value: Any) -> int:
+        return self.client.rpush(self._key(key), json.dumps(value))
+
+    def peek(self, key: str) -> list:
+        return [json.loads(item) for item in self.client.lrange(self._key(key), 0, -1)]
+
+    def pop(self, key: str) -> list:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.lrange(self._key(key), 0, -1)
+        pipe.delete(self._key(key))
+        items, _ = pipe.execute()
+        return [json.loads(item) for item in items]
+
+    def close(self):
+        self.client.close()
+
+
+def create_state_backend(kind: str, db_path: str = None, redis_url: str = None) -> StateBackend:
+    """Create the state backend selected by STATE_BACKEND"""
+    if kind == "memory":
+        return MemoryStateBackend()
+    if kind == "sqlite":
+        return SQLiteStateBackend(db_path)
+    if kind == "redis":
+        return RedisStateBackend(redis_url)
+    raise ValueError(f"Unknown state backend: {kind}")
@@ -0,0 +1,101 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from telegram.error import NetworkError
+
+from config import MESSAGES
+from database import Database
+from handlers import BotHandlers
+
+USER_ID = 42
+
+
+class FakeBot:
+    """Copies succeed except for the storage message ids listed in `failing`"""
+
+    username = "bot"
+
+    def __init__(self):
+        self.failing = set()
+        self.copied = []
+        self.sent = []
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        if message_id in self.failing:
+            raise NetworkError("timed out")
+        self.copied.append(message_id)
+        return SimpleNamespace(message_id=1000 + message_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+
+    async def delete_message(self, chat_id, message_id):
+        pass
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+@pytest.fixture
+def handlers(tmp_path):
+    return BotHandlers(Database(str(tmp_path / "outbox.db")))
+
+
+def make_batch(db: Database, count: int) -> str:
+    batch_id = db.create_batch_group("batch", 1)
+    for message_id in range(1, count + 1):
+        db.save_file(f"file-{message_id}", f"{message_id}.mkv", "document", message_id, 1,
+                     batch_id=batch_id, storage_channel_id=-100)
+    return batch_id
+
+
+def make_due(db: Database):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('UPDATE outbox SET next_attempt = 0')
+
+
+def test_partial_pass_does_not_claim_all_delivered(handlers):
+    messages = MESSAGES["en"]
+    bot = FakeBot()
+    batch_id = make_batch(handlers.db, 5)
+    plan = handlers.compile_delivery_plan(batch_id)
+    user = SimpleNamespace(id=USER_ID, username="user", language_code="en")
+    update = SimpleNamespace(effective_user=user, message=FakeMessage())
+    context = SimpleNamespace(bot=bot)
+
+    async def scenario():
+        # File 3 fails, so files 3-5 are queued
+        bot.failing = {3}
+        await handlers.deliver_batch_files(update, context, plan, batch_id)
+        assert bot.copied == [1, 2]
+        assert update.message.replies == [messages["delivery_queued"]]
+
+        # File 3 goes through, file 4 fails and file 5 is deferred behind it
+        bot.failing = {4}
+        make_due(handlers.db)
+        await handlers.process_outbox(context)
+        assert bot.copied == [1, 2, 3]
+        assert bot.sent == [messages["delivery_continuing"]]
+
+        # The last pass delivers the rest and only then says "all"
+        bot.failing = set()
+        make_due(handlers.db)
+        await handlers.process_outbox(context)
+        assert bot.copied == [1, 2, 3, 4, 5]
+        assert bot.sent == [messages["delivery_continuing"], messages["batch_delivered"]]
+        assert not handlers.db.is_delivery_pending(USER_ID)
+
+        for task in list(handlers.lifecycle._tasks):
+            task.cancel()
+
+    asyncio.run(scenario())
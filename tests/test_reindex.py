@@ -0,0 +1,82 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from telegram.error import NetworkError
+
+from database import Database
+from reindex import FakeChannelHistory, Reindexer
+
+CHANNEL_ID = -1001
+
+
+def make_history(count: int) -> dict:
+    # Every 10th id is a gap (deleted message), every 7th a text message
+    history = {}
+    for message_id in range(1, count + 1):
+        if message_id % 10 == 0:
+            continue
+        if message_id % 7 == 0:
+            history[message_id] = SimpleNamespace(document=None, photo=None, video=None, audio=None)
+            continue
+        history[message_id] = FakeChannelHistory.media_message("document", f"file_{message_id}.pdf",
+                                                               "application/pdf")
+    return history
+
+
+def file_codes(db: Database) -> dict:
+    with sqlite3.connect(db.db_path) as conn:
+        return dict(conn.execute('SELECT message_id, file_code FROM files WHERE storage_channel_id = ?',
+                                 (CHANNEL_ID,)))
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / "reindex.db"))
+
+
+def test_resume_continues_after_checkpoint(db):
+    source = FakeChannelHistory(make_history(200))
+    reindexer = Reindexer(db, batch_size=25, window=8, max_gap=20)
+
+    first = asyncio.run(reindexer.run(CHANNEL_ID, source, 1, end_id=100))
+    assert db.get_reindex_checkpoint(CHANNEL_ID) == 99
+    resumed = asyncio.run(reindexer.run(CHANNEL_ID, source, 1))
+
+    assert resumed["first_message_id"] == 100
+    expected = {i for i in range(1, 201) if i % 10 and i % 7}
+    assert set(file_codes(db)) == expected
+    assert first["inserted"] + resumed["inserted"] == len(expected)
+    assert db.get_reindex_checkpoint(CHANNEL_ID) == 199
+
+
+def test_rerun_refreshes_rows_and_keeps_codes(db):
+    source = FakeChannelHistory(make_history(120))
+    reindexer = Reindexer(db, batch_size=25, window=8, max_gap=20)
+    asyncio.run(reindexer.run(CHANNEL_ID, source, 1))
+    codes = file_codes(db)
+
+    again = asyncio.run(reindexer.run(CHANNEL_ID, source, 1, start_id=1))
+
+    assert again["inserted"] == 0
+    assert again["updated"] == len(codes)
+    assert file_codes(db) == codes
+
+
+def test_telegram_error_saves_checkpoint(db):
+    class FailingHistory(FakeChannelHistory):
+        async def fetch(self, channel_id, message_ids):
+            if message_ids[0] > 60:
+                raise NetworkError("connection lost")
+            return await super().fetch(channel_id, message_ids)
+
+    reindexer = Reindexer(db, batch_size=1000, window=8, max_gap=20)
+    with pytest.raises(NetworkError):
+        asyncio.run(reindexer.run(CHANNEL_ID, FailingHistory(make_history(200)), 1))
+
+    assert db.get_reindex_checkpoint(CHANNEL_ID) == 64
+    assert max(file_codes(db)) == 64
@@ -2,18 +2,26 @@ import hashlib
 import random
 import string
 import asyncio
-from typing import Tuple
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+import itertools
+from typing import Optional, Tuple
+from telegram import Bot
 from telegram.error import TelegramError
-from config import REQUIRED_CHANNELS
+from config import REQUIRED_CHANNELS, STORAGE_CHANNEL_IDS
 import logging
 
 logger = logging.getLogger(__name__)
 
+_storage_rotation = itertools.count()
+
 def generate_share_link(bot_username: str, file_code: str) -> str:
     """Generate shareable link for the file"""
     return f"https://t.me/{bot_username}?start={file_code}"
 
+def storage_channel_order() -> list:
+    """Storage channels to try for the next upload, rotated round-robin"""
+    start = next(_storage_rotation) % len(STORAGE_CHANNEL_IDS)
+    return STORAGE_CHANNEL_IDS[start:] + STORAGE_CHANNEL_IDS[:start]
+
 async def check_channel_membership(bot: Bot, user_id: int) -> Tuple[bool, list]:
     """Check if user is member of all required channels"""
     not_joined = []
@@ -35,33 +43,6 @@ async def check_channel_membership(bot: Bot, user_id: int) -> Tuple[bool, list]:
     is_member = len(not_joined) == 0
     return is_member, not_joined
 
-def create_channel_join_keyboard(not_joined_channels: list, file_code: str = None) -> InlineKeyboardMarkup:
-    """Create inline keyboard with channel join buttons"""
-    keyboard = []
-    
-    # Add channel join buttons (2 per row)
-    for i in range(0, len(not_joined_channels), 2):
-        row = []
-        for j in range(2):
-            if i + j < len(not_joined_channels):
-                channel = not_joined_channels[i + j]
-                row.append(InlineKeyboardButton(
-                    f"Join {channel['name']}",
-                    url=channel['url']
-                ))
-        keyboard.append(row)
-    
-    # Add retry button if file_code is provided
-    if file_code:
-        keyboard.append([
-            InlineKeyboardButton(
-                "🔄 Retry / পুনরায় চেষ্টা করুন",
-                callback_data=f"retry_{file_code}"
-            )
-        ])
-    
-    return InlineKeyboardMarkup(keyboard)
-
 def get_file_type(file_obj) -> str:
     """Determine file type from telegram file object"""
     if hasattr(file_obj, 'mime_type') and file_obj.mime_type:
@@ -84,6 +65,22 @@ def get_file_type(file_obj) -> str:
         return mime_types.get(extension, 'application/octet-stream')
     return 'unknown'
 
+def extract_media(message) -> Optional[Tuple[object, str, str]]:
+    """Return (file_obj, file_name, file_type) for the media in a message, or None"""
+    if message.document:
+        document = message.document
+        return document, document.file_name or "Unknown", get_file_type(document)
+    if message.photo:
+        photo = message.photo[-1]  # Highest quality
+        return photo, f"photo_{photo.file_unique_id}.jpg", "image/jpeg"
+    if message.video:
+        video = message.video
+        return video, video.file_name or f"video_{video.file_unique_id}.mp4", get_file_type(video)
+    if message.audio:
+        audio = message.audio
+        return audio, audio.file_name or f"audio_{audio.file_unique_id}.mp3", get_file_type(audio)
+    return None
+
 def is_admin(user_id: int) -> bool:
     """Check if user is admin"""
     from config import ADMIN_USER_ID
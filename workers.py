@@ -0,0 +1,164 @@
+"""
+Sharded multi-worker deployment.
+
+A single router process receives Telegram webhook updates and hands each one
+to a worker process chosen by the sender's user id, so every user's updates are
+processed in order by the same worker while different users run in parallel.
+Workers share the SQLite database (WAL mode) and a pluggable state backend.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue as queue_module
+import signal
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# Update fields that carry the acting user, in the order they are checked
+USER_FIELDS = ("message", "edited_message", "callback_query", "inline_query",
+               "chosen_inline_result", "channel_post", "my_chat_member", "chat_member")
+
+
+def shard_for(user_id: int, worker_count: int) -> int:
+    """Pick the worker responsible for a user"""
+    return user_id % worker_count
+
+
+def update_user_id(data: dict) -> int:
+    """Extract the acting user id from a raw update, 0 if it has none"""
+    for field in USER_FIELDS:
+        payload = data.get(field)
+        if not payload:
+            continue
+        sender = payload.get("from") or payload.get("chat") or {}
+        return sender.get("id", 0)
+    return 0
+
+
+class ShardRouter:
+    """Route raw updates onto per-worker queues"""
+
+    def __init__(self, queues: List[multiprocessing.Queue]):
+        self.queues = queues
+        self.accepting = True
+
+    def route(self, data: dict) -> int:
+        """Queue an update on its worker and return the worker index"""
+        index = shard_for(update_user_id(data), len(self.queues))
+        self.queues[index].put(data)
+        return index
+
+    def stop(self):
+        """Tell every worker to finish its queue and exit"""
+        self.accepting = False
+        for queue in self.queues:
+            queue.put(None)
+
+
+def run_worker(index: int, queue: multiprocessing.Queue):
+    """Process entry point for a worker"""
+    # Ctrl+C and a service manager's SIGTERM reach the whole process group;
+    # workers stop when the router sends the stop sentinel, so queued updates
+    # are not dropped and post_stop drains in-flight deliveries
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    import main  # noqa: F401 - configures logging for this process
+    try:
+        asyncio.run(_worker_loop(index, queue))
+    except KeyboardInterrupt:
+        pass
+    logger.info(f"Worker {index} stopped")
+
+
+async def _worker_loop(index: int, queue: multiprocessing.Queue):
+    """Feed updates from the router into this worker's application"""
+    from telegram import Update
+    from main import build_application
+
+    application = build_application(worker_index=index)
+    loop = asyncio.get_running_loop()
+
+    async with application:
+        await application.start()
+        # post_init is only invoked by run_polling/run_webhook, so call it ourselves
+        if application.post_init:
+            await application.post_init(application)
+        logger.info(f"Worker {index} ready")
+
+        router = multiprocessing.parent_process()
+        while True:
+            try:
+                data = await loop.run_in_executor(None, queue.get, True, 1.0)
+            except queue_module.Empty:
+                # Signals are ignored, so stop on our own if the router was killed
+                if router and not router.is_alive():
+                    logger.warning(f"Worker {index}: router exited without stopping workers")
+                    break
+                continue
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+
+
+def run_sharded(worker_count: int):
+    """Start the webhook router and worker processes"""
+    from telegram import Bot
+    from flask import request, abort
+    from config import BOT_TOKEN, WEBHOOK_URL, WEBHOOK_SECRET, ALLOWED_UPDATES
+    from keep_alive import app, keep_alive
+
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL must be set when WORKER_COUNT > 1")
+
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue() for _ in range(worker_count)]
+    router = ShardRouter(queues)
+
+    processes = [
+        context.Process(target=run_worker, args=(index, queue), name=f"worker-{index}")
+        for index, queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+
+    @app.route('/webhook', methods=['POST'])
+    def webhook():
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            abort(403)
+        if not router.accepting:
+            # Telegram redelivers the update once the next deployment is up
+            abort(503)
+        router.route(request.get_json(force=True))
+        return "ok"
+
+    async def register_webhook():
+        async with Bot(BOT_TOKEN) as bot:
+            await bot.set_webhook(
+                url=f"{WEBHOOK_URL.rstrip('/')}/webhook",
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=ALLOWED_UPDATES
+            )
+
+    asyncio.run(register_webhook())
+    logger.info(f"Webhook router started with {worker_count} workers")
+
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+
+    # Rolling restarts send SIGTERM; treat it like Ctrl+C so workers drain
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    keep_alive()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        router.stop()
+        for process in processes:
+            process.join()